@@ -0,0 +1,37 @@
+""" Benchmarks for generators_to_coroutines.
+
+Each module can be run from the repository root, e.g.
+
+    python -m benchmarks.cache_import
+"""
+
+import timeit
+
+
+def bestOf(func, repeat=5, number=1):
+    """ Return the best time, in seconds per call, of calling func. """
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def report(name, seconds, unit='ms'):
+    scale = {'s': 1.0, 'ms': 1e3, 'us': 1e6, 'ns': 1e9}[unit]
+    print('%-50s %12.3f %s' % (name, seconds * scale, unit))
+
+
+class NullSink(object):
+    """ A target discarding the values sent to it, so that only the stages
+    before it are measured. """
+
+    def send(self, val):
+        pass
+
+    def close(self):
+        pass
+
+
+def isOdd(val):
+    return val % 2
+
+
+def double(val):
+    return val * 2
@@ -0,0 +1,52 @@
+""" Many asynchronous pipelines (aco) driven concurrently by one event loop,
+pushing to sinks that yield to the event loop on every value, like network
+writers would. """
+
+import asyncio
+import time
+
+from generators_to_coroutines.aio import apushFromIterable
+from generators_to_coroutines.tools import genFilter, genMap, genPairs
+
+from . import double, isOdd, report
+
+PIPELINES = 1000
+COUNT = 200
+
+
+class YieldingSink(object):
+
+    def asend(self, val):
+        return asyncio.sleep(0)
+
+    def aclose(self):
+        return asyncio.sleep(0)
+
+
+def pipeline(target):
+    return genFilter.aco(isOdd, genMap.aco(double, genPairs.aco(target)))
+
+
+def main():
+    values = list(range(COUNT))
+    pipeline(YieldingSink())
+
+    loop = asyncio.new_event_loop()
+    try:
+        start = time.perf_counter()
+        loop.run_until_complete(asyncio.wait([
+            loop.create_task(apushFromIterable(values,
+                                               pipeline(YieldingSink())))
+            for _ in range(PIPELINES)]))
+        elapsed = time.perf_counter() - start
+    finally:
+        loop.close()
+
+    print('%d concurrent pipelines of filter, map and pairs, %d values each:'
+          % (PIPELINES, COUNT))
+    report('total', elapsed)
+    report('per value', elapsed / (PIPELINES * COUNT), 'ns')
+
+
+if __name__ == '__main__':
+    main()
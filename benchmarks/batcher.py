@@ -0,0 +1,115 @@
+""" Throughput of bulk sinks written one value at a time, and in batches by
+genBatch and TimedBatcher, and the latency of values sent just before the
+producer goes quiet. """
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from generators_to_coroutines.concurrency import TimedBatcher
+from generators_to_coroutines.tools import genBatch, genMap, pushAll
+
+from . import bestOf, report
+
+COUNT = 20000
+BATCH_SIZES = [16, 256]
+QUIET_SECONDS = 0.2
+MAX_LATENCY = 0.01
+
+
+def row(val):
+    return (val, 'value %d' % val)
+
+
+class SqliteSink(object):
+    """ Inserts and commits each row sent to it """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS rows (id INTEGER, name TEXT)')
+
+    def send(self, row):
+        with self.connection:
+            self.connection.execute('INSERT INTO rows VALUES (?, ?)', row)
+
+    def close(self):
+        self.connection.close()
+
+
+class BulkSqliteSink(SqliteSink):
+    """ Inserts and commits each batch of rows sent to it """
+
+    def send(self, rows):
+        with self.connection:
+            self.connection.executemany('INSERT INTO rows VALUES (?, ?)', rows)
+
+
+class LatencySink(object):
+    """ Records how long each value waited to be written """
+
+    def __init__(self):
+        self.latencies = []
+
+    def send(self, batch):
+        now = time.time()
+        self.latencies.extend(now - sent for sent in batch)
+
+    def close(self):
+        pass
+
+
+def maxLatency(makeStage):
+    """ The longest wait of a value, when the producer sends a burst of
+    values, goes quiet, then closes """
+
+    sink = LatencySink()
+    stage = makeStage(sink)
+    for _ in range(10):
+        stage.send(time.time())
+    time.sleep(QUIET_SECONDS)
+    stage.close()
+    return max(sink.latencies)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'rows.db')
+    values = list(range(COUNT))
+
+    try:
+        print('Writing %d rows to SQLite, per row:' % COUNT)
+        report('one row at a time',
+               bestOf(lambda: pushAll(values, genMap.co(
+                   row, SqliteSink(path))), repeat=3) / COUNT,
+               'us')
+
+        for size in BATCH_SIZES:
+            report('genBatch, %d rows' % size,
+                   bestOf(lambda: pushAll(values, genMap.co(
+                       row, genBatch.co(size, BulkSqliteSink(path)))),
+                       repeat=3) / COUNT,
+                   'us')
+            report('TimedBatcher, %d rows' % size,
+                   bestOf(lambda: pushAll(values, genMap.co(
+                       row, TimedBatcher(BulkSqliteSink(path), size,
+                                         MAX_LATENCY))),
+                       repeat=3) / COUNT,
+                   'us')
+    finally:
+        shutil.rmtree(directory)
+
+    print('Longest wait of a value sent before %g s without values, with '
+          'a limit of %g s:' % (QUIET_SECONDS, MAX_LATENCY))
+    report('genBatch',
+           maxLatency(lambda sink: genBatch.co(1000, sink, MAX_LATENCY)),
+           'ms')
+    report('TimedBatcher',
+           maxLatency(lambda sink: TimedBatcher(sink, 1000, MAX_LATENCY)),
+           'ms')
+
+
+if __name__ == '__main__':
+    main()
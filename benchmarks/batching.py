@@ -0,0 +1,40 @@
+""" Throughput of a coroutine pipeline pushed one value at a time (co),
+compared to the batched version pushed lists of values (co_batch). """
+
+from generators_to_coroutines.tools import genFilter, genMap, genPairs, \
+    pushFromIterable, pushChunksFromIterable
+
+from . import NullSink, bestOf, double, isOdd, report
+
+COUNT = 200000
+CHUNK_SIZES = [16, 256, 4096]
+
+
+def elementPipeline(target):
+    return genFilter.co(isOdd, genMap.co(double, genPairs.co(target)))
+
+
+def batchedPipeline(target):
+    return genFilter.co_batch(
+        isOdd, genMap.co_batch(double, genPairs.co_batch(target)))
+
+
+def main():
+    values = list(range(COUNT))
+
+    print('Pushing %d values through filter, map and pairs, per value:' %
+          COUNT)
+    report('co',
+           bestOf(lambda: pushFromIterable(
+               values, elementPipeline(NullSink()))) / COUNT,
+           'ns')
+
+    for chunkSize in CHUNK_SIZES:
+        report('co_batch, chunks of %d' % chunkSize,
+               bestOf(lambda: pushChunksFromIterable(
+                   values, batchedPipeline(NullSink()), chunkSize)) / COUNT,
+               'ns')
+
+
+if __name__ == '__main__':
+    main()
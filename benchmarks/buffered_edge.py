@@ -0,0 +1,75 @@
+""" Overhead of a BufferedEdge between push stages, and the time a producer is
+held up by a sink that periodically blocks on I/O, pushed directly and
+through a BufferedEdge with each policy. """
+
+import time
+
+from generators_to_coroutines.concurrency import BLOCK, DROP, SPILL, \
+    BufferedEdge
+from generators_to_coroutines.tools import genMap, pushAll
+
+from . import NullSink, bestOf, double, report
+
+COUNT = 100000
+IO_EVERY = 1000
+IO_SECONDS = 0.002
+BUFFER_SIZE = 4096
+
+
+class BlockingSink(object):
+    """ Blocks, like a write to a slow device, every IO_EVERY values """
+
+    def __init__(self):
+        self.count = 0
+
+    def send(self, val):
+        self.count += 1
+        if self.count % IO_EVERY == 0:
+            time.sleep(IO_SECONDS)
+
+    def close(self):
+        pass
+
+
+def producerTime(makeTarget, values):
+    """ Seconds per value spent pushing, and in total until closed """
+
+    target = makeTarget()
+    start = time.time()
+    pushAll(values, genMap.co(double, target), close=False)
+    pushed = time.time()
+    target.close()
+    return (pushed - start) / len(values), (time.time() - start) / len(values)
+
+
+def main():
+    values = list(range(COUNT))
+
+    print('Pushing %d values through map, per value:' % COUNT)
+    report('direct, to a null sink',
+           bestOf(lambda: pushAll(values, genMap.co(double, NullSink())))
+           / COUNT,
+           'ns')
+    report('BufferedEdge, to a null sink',
+           bestOf(lambda: pushAll(values, genMap.co(
+               double, BufferedEdge(NullSink(), BUFFER_SIZE)))) / COUNT,
+           'ns')
+
+    print('To a sink blocking for %g ms every %d values, per value, while '
+          'pushing / until closed:' % (IO_SECONDS * 1e3, IO_EVERY))
+    for name, makeTarget in [
+            ('direct', BlockingSink),
+            ('BufferedEdge, block', lambda: BufferedEdge(
+                BlockingSink(), BUFFER_SIZE, BLOCK)),
+            ('BufferedEdge, drop', lambda: BufferedEdge(
+                BlockingSink(), BUFFER_SIZE, DROP)),
+            ('BufferedEdge, spill', lambda: BufferedEdge(
+                BlockingSink(), BUFFER_SIZE, SPILL))]:
+        pushing, total = min(producerTime(makeTarget, values)
+                             for _ in range(3))
+        report('%s, while pushing' % name, pushing, 'ns')
+        report('%s, until closed' % name, total, 'ns')
+
+
+if __name__ == '__main__':
+    main()
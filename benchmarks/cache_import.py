@@ -0,0 +1,77 @@
+""" Compare cold and warm import time of a module with many decorated stages,
+with and without the persistent code cache. """
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import report
+
+STAGE_COUNT = 200
+RUNS = 5
+
+_stageTemplate = '''
+@invertibleGenerator
+def genStage%(index)d(func, iterable):
+    """ Stage %(index)d """
+
+    count = 0
+    for val in iterable:
+        count += 1
+        if count %% 2:
+            yield func(val)
+'''
+
+
+def _writeStageModule(directory):
+    with open(os.path.join(directory, 'manystages.py'), 'w') as module:
+        module.write('from generators_to_coroutines import '
+                     'invertibleGenerator\n')
+        for index in range(STAGE_COUNT):
+            module.write(_stageTemplate % {'index': index})
+
+
+def _timeImport(directory, cacheSetting):
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(
+        [directory, os.getcwd(), environment.get('PYTHONPATH', '')])
+    environment['GENERATORS_TO_COROUTINES_CACHE'] = cacheSetting
+
+    start = time.time()
+    subprocess.check_call([sys.executable, '-c', 'import manystages'],
+                          env=environment)
+    return time.time() - start
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        _writeStageModule(directory)
+        cacheDirectory = os.path.join(directory, 'cache')
+
+        # python's own bytecode cache is warmed up first, so only the
+        # transformation cost differs between runs
+        _timeImport(directory, '0')
+
+        uncached = min(_timeImport(directory, '0') for _ in range(RUNS))
+
+        cold = []
+        for _ in range(RUNS):
+            shutil.rmtree(cacheDirectory, ignore_errors=True)
+            cold.append(_timeImport(directory, cacheDirectory))
+
+        warm = min(_timeImport(directory, cacheDirectory) for _ in range(RUNS))
+
+        print('Importing a module with %d decorated stages:' % STAGE_COUNT)
+        report('no cache', uncached)
+        report('cold cache', min(cold))
+        report('warm cache', warm)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+""" Cost of applying invertibleGenerator to module-level functions, nested
+functions and methods, at different call stack depths.
+
+Every generator is converted once before timing, so these measure the
+decoration path itself rather than the AST transformation. The time taken to
+recurse to each depth is measured on its own and subtracted. """
+
+from generators_to_coroutines import invertibleGenerator
+
+from . import bestOf, report
+
+DEPTHS = [1, 10, 100]
+NUMBER = 1000
+
+
+def genModuleLevel(iterable):
+    for val in iterable:
+        yield val
+
+
+def decorateModuleLevel():
+    invertibleGenerator(genModuleLevel)
+
+
+def decorateNested():
+
+    @invertibleGenerator
+    def genNested(iterable):
+        for val in iterable:
+            yield val
+
+
+def decorateMethod():
+
+    class Stage(object):
+
+        @invertibleGenerator
+        def gen(self, iterable):
+            for val in iterable:
+                yield val
+
+
+def doNothing():
+    pass
+
+
+def atDepth(depth, func):
+    """ Call func with depth frames on the stack above it. """
+    if depth <= 1:
+        return func()
+    return atDepth(depth - 1, func)
+
+
+def main():
+    cases = [
+        ('module-level', decorateModuleLevel),
+        ('nested', decorateNested),
+        ('method', decorateMethod),
+    ]
+
+    recursion = dict(
+        (depth, bestOf(lambda: atDepth(depth, doNothing), number=NUMBER))
+        for depth in DEPTHS)
+
+    print('Decoration cost per call, excluding the recursion to the depth:')
+    for name, decorate in cases:
+        decorate()
+        for depth in DEPTHS:
+            seconds = bestOf(lambda: atDepth(depth, decorate), number=NUMBER)
+            report('%s, stack depth %d' % (name, depth),
+                   seconds - recursion[depth], 'us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+""" Per value overhead of the push drivers, pushing into a minimal coroutine,
+compared to a plain python loop (the former pushFromIterable). """
+
+from generators_to_coroutines.decorators import coroutine
+from generators_to_coroutines.tools import pushAll, pushUpTo, pushDuring
+
+from . import bestOf, report
+
+COUNT = 200000
+
+
+@coroutine
+def coDiscard():
+    while True:
+        (yield)
+
+
+def pushWithLoop(iterable, target):
+    try:
+        for elem in iterable:
+            target.send(elem)
+
+        target.close()
+    except StopIteration:
+        pass
+
+
+def pushInSlices(values, sliceSize):
+    iterator = iter(values)
+    target = coDiscard()
+    while not pushUpTo(iterator, target, sliceSize).exhausted:
+        pass
+
+
+def pushInTimeSlices(values, seconds):
+    iterator = iter(values)
+    target = coDiscard()
+    while not pushDuring(iterator, target, seconds).exhausted:
+        pass
+
+
+def main():
+    values = list(range(COUNT))
+
+    print('Pushing %d values into a coroutine, per value:' % COUNT)
+    report('python loop, list',
+           bestOf(lambda: pushWithLoop(values, coDiscard())) / COUNT, 'ns')
+    report('pushAll, list',
+           bestOf(lambda: pushAll(values, coDiscard())) / COUNT, 'ns')
+    report('python loop, generator',
+           bestOf(lambda: pushWithLoop(
+               (val for val in values), coDiscard())) / COUNT, 'ns')
+    report('pushAll, generator',
+           bestOf(lambda: pushAll(
+               (val for val in values), coDiscard())) / COUNT, 'ns')
+    report('pushUpTo, slices of 1024',
+           bestOf(lambda: pushInSlices(values, 1024)) / COUNT, 'ns')
+    report('pushDuring, slices of 1 ms',
+           bestOf(lambda: pushInTimeSlices(values, 0.001)) / COUNT, 'ns')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+""" Throughput of a pipeline of coroutines, one per stage, compared to the
+same pipeline fused into a single coroutine. """
+
+from generators_to_coroutines.fusion import fusePipeline
+from generators_to_coroutines.tools import genPassthrough, genFilter, \
+    genMap, genPairs, pushFromIterable
+
+from . import NullSink, bestOf, double, isOdd, report
+
+COUNT = 200000
+
+
+def coroutinePipeline(target):
+    return genPassthrough.co(
+        genFilter.co(isOdd, genMap.co(double, genPairs.co(target))))
+
+
+fusedPipeline = fusePipeline(
+    genPassthrough, (genFilter, isOdd), (genMap, double), genPairs)
+
+
+def main():
+    values = list(range(COUNT))
+
+    print('Pushing %d values through passthrough, filter, map and pairs, '
+          'per value:' % COUNT)
+    report('co',
+           bestOf(lambda: pushFromIterable(
+               values, coroutinePipeline(NullSink()))) / COUNT,
+           'ns')
+    report('fused',
+           bestOf(lambda: pushFromIterable(
+               values, fusedPipeline(NullSink()))) / COUNT,
+           'ns')
+
+
+if __name__ == '__main__':
+    main()
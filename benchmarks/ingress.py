@@ -0,0 +1,83 @@
+""" Several producer threads feeding one pipeline: serialized by a lock around
+send, and through a ThreadSafeIngress, one value and a batch at a time. """
+
+import threading
+import time
+
+from generators_to_coroutines.concurrency import ThreadSafeIngress
+from generators_to_coroutines.tools import genFilter, genMap
+
+from . import NullSink, double, isOdd, report
+
+PRODUCERS = [1, 4, 16]
+COUNT = 200000
+BATCH_SIZE = 64
+
+
+def pipeline():
+    return genMap.co(double, genFilter.co(isOdd, NullSink()))
+
+
+class LockedTarget(object):
+    """ The usual workaround: a lock around every send """
+
+    def __init__(self, target):
+        self.target = target
+        self.lock = threading.Lock()
+
+    def send(self, val):
+        with self.lock:
+            self.target.send(val)
+
+    def close(self):
+        self.target.close()
+
+
+def sendEach(target, values):
+    send = target.send
+    for val in values:
+        send(val)
+
+
+def sendBatches(target, values):
+    for start in range(0, len(values), BATCH_SIZE):
+        target.sendMany(values[start:start + BATCH_SIZE])
+
+
+def feed(target, producers, produce):
+    """ Seconds per value for the producers to send all values, and for the
+    pipeline to have pushed them """
+
+    values = list(range(COUNT // producers))
+    threads = [threading.Thread(target=produce, args=(target, values))
+               for _ in range(producers)]
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    target.close()
+
+    return (time.time() - start) / (len(values) * producers)
+
+
+def main():
+    print('Feeding %d values to one pipeline, per value:' % COUNT)
+
+    for producers in PRODUCERS:
+        for name, makeTarget, produce in [
+                ('lock around send', lambda: LockedTarget(pipeline()),
+                 sendEach),
+                ('ThreadSafeIngress.send',
+                 lambda: ThreadSafeIngress(pipeline()), sendEach),
+                ('ThreadSafeIngress.sendMany(%d)' % BATCH_SIZE,
+                 lambda: ThreadSafeIngress(pipeline()), sendBatches)]:
+            report('%d producers, %s' % (producers, name),
+                   min(feed(makeTarget(), producers, produce)
+                       for _ in range(3)),
+                   'ns')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+""" Overhead of instrumented coroutine pipelines, compared to the same
+pipelines converted without instrumentation. """
+
+from generators_to_coroutines import instrumentation, invertibleGenerator
+from generators_to_coroutines.tools import pushAll
+
+from . import NullSink, bestOf, report
+
+COUNT = 200000
+
+
+def makeStages():
+    """ Define and convert the stages anew, so they are instrumented if
+    instrumentation is enabled. """
+
+    @invertibleGenerator
+    def genOdd(iterable):
+        for val in iterable:
+            if val % 2:
+                yield val
+
+    @invertibleGenerator
+    def genDouble(iterable):
+        for val in iterable:
+            yield val * 2
+
+    return lambda target: genOdd.co(genDouble.co(target))
+
+
+def main():
+    values = list(range(COUNT))
+
+    plain = makeStages()
+    instrumentation.enableInstrumentation()
+    instrumented = makeStages()
+    instrumentation.disableInstrumentation()
+
+    print('Pushing %d values through two stages, per value:' % COUNT)
+    report('uninstrumented',
+           bestOf(lambda: pushAll(values, plain(NullSink()))) / COUNT, 'ns')
+    report('instrumented',
+           bestOf(lambda: pushAll(values, instrumented(NullSink()))) / COUNT,
+           'ns')
+
+    print('')
+    instrumentation.reportStageStats()
+
+
+if __name__ == '__main__':
+    main()
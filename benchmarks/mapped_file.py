@@ -0,0 +1,90 @@
+""" Time and peak resident memory of pushing the lines of a log file, most of
+which are filtered out, from the file object, and with pushMappedFile. Each
+is run in a separate process, which reports its own peak memory. """
+
+import io
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+from generators_to_coroutines.mapped import pushMappedFile
+from generators_to_coroutines.tools import genDecode, genFilter, genMap, \
+    pushFromIterable
+
+from . import NullSink, report
+
+COUNT = 200000
+# line length in characters, and the character padding lines to it
+LINES = [(64, u'x'), (1024, u'x'), (1024, u'\xe9')]
+ERROR_EVERY = 1000
+
+
+def isErrorLine(line):
+    return line.startswith('ERROR')
+
+
+def isErrorRecord(record):
+    return record[:5] == b'ERROR'
+
+
+def pushLines(path):
+    with io.open(path, encoding='utf-8') as lines:
+        pushFromIterable(lines, genFilter.co(
+            isErrorLine, genMap.co(str.split, NullSink())))
+
+
+def pushMapped(path):
+    pushMappedFile(path, genFilter.co(
+        isErrorRecord, genDecode.co(genMap.co(str.split, NullSink()))))
+
+
+def writeLog(path, count, lineLength, padding):
+    line = u'INFO request served by worker 7 '
+    line += padding * (lineLength - len(line) - 1) + u'\n'
+    with io.open(path, 'w', encoding='utf-8') as log:
+        for index in range(count):
+            if index % ERROR_EVERY == 0:
+                log.write(u'ERROR something failed at %d\n' % index)
+            else:
+                log.write(line)
+
+
+def child(mode, path):
+    func = {'lines': pushLines, 'mapped': pushMapped}[mode]
+    seconds = min(timeit.repeat(lambda: func(path), repeat=3, number=1))
+    # ru_maxrss is in kilobytes on Linux
+    print('%r %r' % (seconds,
+                     resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        for lineLength, padding in LINES:
+            path = os.path.join(directory, 'log')
+            writeLog(path, COUNT, lineLength, padding)
+            print('%d lines of %d %s characters, %.1f MB, 1 in %d kept:' % (
+                COUNT, lineLength, 'ASCII' if padding < u'\x80' else 'UTF-8',
+                os.path.getsize(path) / 1e6, ERROR_EVERY))
+
+            for mode, name in [('lines', 'file object, pushFromIterable'),
+                               ('mapped', 'pushMappedFile')]:
+                output = subprocess.check_output(
+                    [sys.executable, '-m', 'benchmarks.mapped_file', mode, path])
+                seconds, maxRss = output.split()
+                report('%s, per line' % name, float(seconds) / COUNT, 'ns')
+                print('%-50s %12.1f MB' % ('%s, peak RSS' % name,
+                                            int(maxRss) / 1e3))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        child(*sys.argv[1:])
+    else:
+        main()
@@ -0,0 +1,37 @@
+""" Cost of accessing invertible generator methods, and the coroutines
+attached to them, compared to a plain method. """
+
+from generators_to_coroutines import hasInvertibleMethods, \
+    invertibleGenerator
+
+from . import bestOf, report
+
+NUMBER = 100000
+
+
+@hasInvertibleMethods
+class Stage(object):
+
+    def plain(self, iterable):
+        for val in iterable:
+            yield val
+
+    @invertibleGenerator
+    def gen(self, iterable):
+        for val in iterable:
+            yield val
+
+
+def main():
+    obj = Stage()
+    obj.gen.co
+
+    print('Per access:')
+    report('obj.plain', bestOf(lambda: obj.plain, number=NUMBER), 'ns')
+    report('obj.gen', bestOf(lambda: obj.gen, number=NUMBER), 'ns')
+    report('obj.gen.co', bestOf(lambda: obj.gen.co, number=NUMBER), 'ns')
+    report('obj.gen([])', bestOf(lambda: obj.gen([]), number=NUMBER), 'ns')
+
+
+if __name__ == '__main__':
+    main()
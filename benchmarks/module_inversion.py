@@ -0,0 +1,66 @@
+""" Compare converting the generators of a large module one at a time, as the
+decorators do on import, with converting them all at once with invertModule.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from generators_to_coroutines.modules import invertModule
+
+from . import report
+
+STAGE_COUNTS = [10, 100, 400]
+
+_stageTemplate = '''
+
+@invertibleGenerator
+def genStage%(index)d(func, iterable):
+    """ Stage %(index)d """
+
+    count = 0
+    for val in iterable:
+        count += 1
+        if count %% 2:
+            yield func(val)
+'''
+
+
+def _writeStageModule(directory, name, stageCount):
+    with open(os.path.join(directory, name + '.py'), 'w') as module:
+        module.write('from generators_to_coroutines import '
+                     'invertibleGenerator\n')
+        for index in range(stageCount):
+            module.write(_stageTemplate % {'index': index})
+
+
+def _timeImport(importFunc, name):
+    start = time.time()
+    importFunc(name)
+    return time.time() - start
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    sys.path.insert(0, directory)
+    try:
+        print('Importing a module with decorated stages:')
+        for stageCount in STAGE_COUNTS:
+            perFunction = 'stages_per_function_%d' % stageCount
+            wholeModule = 'stages_whole_module_%d' % stageCount
+            _writeStageModule(directory, perFunction, stageCount)
+            _writeStageModule(directory, wholeModule, stageCount)
+
+            report('%d stages, one at a time' % stageCount,
+                   _timeImport(__import__, perFunction))
+            report('%d stages, invertModule' % stageCount,
+                   _timeImport(invertModule, wholeModule))
+    finally:
+        sys.path.remove(directory)
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+""" Decoration cost of generators defined inside a factory function, over
+repeated factory calls. Only the first call should pay for the conversion. """
+
+import time
+
+from generators_to_coroutines import invertibleGenerator
+
+from . import report
+
+CALLS = 1000
+
+
+def makeStage(factor):
+
+    @invertibleGenerator
+    def genScale(iterable):
+        for val in iterable:
+            yield val * factor
+
+    return genScale
+
+
+def main():
+    timings = []
+    for _ in range(CALLS):
+        start = time.time()
+        makeStage(2)
+        timings.append(time.time() - start)
+
+    print('Decorating a nested generator, per factory call:')
+    report('first call', timings[0])
+    for first, last in [(1, 10), (10, 100), (100, CALLS)]:
+        report('calls %d-%d (mean)' % (first + 1, last),
+               sum(timings[first:last]) / (last - first))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+""" Throughput of a pipeline of scalar stages from tools pushed one float at a
+time, compared to the numeric stages pushed NumPy arrays in chunks. """
+
+import numpy
+
+from generators_to_coroutines.numeric import genArrayChunks, \
+    genChunkFilter, genChunkMap, genChunkPairs, pushArray
+from generators_to_coroutines.tools import genFilter, genMap, genPairs, \
+    pushAll
+
+from . import NullSink, bestOf, report
+
+COUNT = 1000000
+CHUNK_SIZES = [256, 4096, 65536]
+
+
+def isPositive(val):
+    return val > 0
+
+
+def isPositiveChunk(chunk):
+    return chunk > 0
+
+
+def scalarPipeline(target):
+    return genFilter.co(isPositive, genMap.co(abs, genPairs.co(target)))
+
+
+def chunkPipeline(target):
+    return genChunkFilter.co(isPositiveChunk, genChunkMap.co(
+        numpy.absolute, genChunkPairs.co(target)))
+
+
+def main():
+    samples = numpy.random.RandomState(0).standard_normal(COUNT)
+    values = samples.tolist()
+
+    print('Pushing %d floats through filter, map and pairs, per value:' %
+          COUNT)
+    report('scalar stages, co',
+           bestOf(lambda: pushAll(values, scalarPipeline(NullSink())),
+                  repeat=3) / COUNT,
+           'ns')
+
+    for chunkSize in CHUNK_SIZES:
+        report('numeric stages, pushArray in chunks of %d' % chunkSize,
+               bestOf(lambda: pushArray(
+                   samples, chunkPipeline(NullSink()), chunkSize)) / COUNT,
+               'ns')
+
+    report('numeric stages, from values by genArrayChunks',
+           bestOf(lambda: pushAll(values, genArrayChunks.co(
+               chunkPipeline(NullSink()))), repeat=3) / COUNT,
+           'ns')
+
+
+if __name__ == '__main__':
+    main()
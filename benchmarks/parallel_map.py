@@ -0,0 +1,47 @@
+""" Throughput of genParallelMap with different numbers of worker threads,
+compared to genMap, for functions that release the GIL: compression, and
+waiting as for I/O. """
+
+import os
+import time
+import zlib
+
+from generators_to_coroutines.tools import genMap, genParallelMap, pushAll
+
+from . import NullSink, bestOf, report
+
+BLOCKS = 64
+BLOCK_SIZE = 256 * 1024
+WORKERS = [1, 2, 4, 8]
+
+
+def compress(block):
+    return zlib.compress(block, 6)
+
+
+def wait(block):
+    time.sleep(0.001)
+    return block
+
+
+def main():
+    blocks = [os.urandom(BLOCK_SIZE) for _ in range(BLOCKS)]
+
+    print('%d CPUs' % (os.cpu_count() or 1))
+    for name, func in [('zlib.compress of 256 KiB', compress),
+                       ('1 ms sleep', wait)]:
+        print('%s, per value:' % name)
+        report('  genMap',
+               bestOf(lambda: pushAll(
+                   blocks, genMap.co(func, NullSink())), repeat=3) / BLOCKS,
+               'us')
+        for workers in WORKERS:
+            report('  genParallelMap, %d workers' % workers,
+                   bestOf(lambda: pushAll(
+                       blocks, genParallelMap.co(func, NullSink(), workers)),
+                       repeat=3) / BLOCKS,
+                   'us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+""" Generator coroutines (co) compared to push objects with __slots__
+(co_object): throughput of a pipeline, construction time and memory per
+pipeline. """
+
+import tracemalloc
+
+from generators_to_coroutines.tools import genFilter, genMap, genPairs, \
+    pushFromIterable
+
+from . import NullSink, bestOf, double, isOdd, report
+
+COUNT = 200000
+PIPELINES = 10000
+
+
+def coroutinePipeline(target):
+    return genFilter.co(isOdd, genMap.co(double, genPairs.co(target)))
+
+
+def objectPipeline(target):
+    return genFilter.co_object(
+        isOdd, genMap.co_object(double, genPairs.co_object(target)))
+
+
+def memoryPerPipeline(pipeline):
+    sink = NullSink()
+    tracemalloc.start()
+    pipelines = [pipeline(sink) for _ in range(PIPELINES)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del pipelines
+    return size / PIPELINES
+
+
+def main():
+    values = list(range(COUNT))
+
+    # convert before timing
+    coroutinePipeline(NullSink())
+    objectPipeline(NullSink())
+
+    for name, pipeline in [('co', coroutinePipeline),
+                           ('co_object', objectPipeline)]:
+        print('%s, filter, map and pairs:' % name)
+        report('  push, per value',
+               bestOf(lambda: pushFromIterable(
+                   values, pipeline(NullSink()))) / COUNT,
+               'ns')
+        report('  construction, per pipeline',
+               bestOf(lambda: pipeline(NullSink()), number=PIPELINES),
+               'us')
+        print('%-50s %12d bytes' % ('  memory, per pipeline',
+                                    memoryPerPipeline(pipeline)))
+
+
+if __name__ == '__main__':
+    main()
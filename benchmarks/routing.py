@@ -0,0 +1,57 @@
+""" Cost of routing values to one of many targets: through a chain of coSplit
+predicates, and through coRoute's dictionary, with fixed targets and with
+targets created by a factory and evicted when idle. """
+
+from generators_to_coroutines.tools import coRoute, coSplit, pushAll
+
+from . import NullSink, bestOf, report
+
+COUNT = 200000
+# chains of coSplit send through one frame per route, and run into the
+# recursion limit well before 1000 routes
+SPLIT_ROUTES = [10, 100]
+ROUTES = [10, 100, 1000]
+
+
+def keyOf(val):
+    return val % 1000
+
+
+def splitChain(routes):
+    target = NullSink()
+    for route in range(routes - 1):
+        target = coSplit((lambda val, route=route: keyOf(val) == route),
+                         NullSink(), target)
+    return target
+
+
+def main():
+    print('Routing %d values, per value:' % COUNT)
+
+    for routes in SPLIT_ROUTES:
+        values = [val % routes for val in range(COUNT)]
+        report('coSplit chain, %d routes' % routes,
+               bestOf(lambda: pushAll(values, splitChain(routes)),
+                      repeat=3) / COUNT,
+               'ns')
+
+    for routes in ROUTES:
+        values = [val % routes for val in range(COUNT)]
+        targets = dict((key, NullSink()) for key in range(routes))
+        report('coRoute, %d routes' % routes,
+               bestOf(lambda: pushAll(values, coRoute(keyOf, targets)))
+               / COUNT,
+               'ns')
+
+    values = [val % 1000 for val in range(COUNT)]
+    for maxRoutes in [None, 2000, 500]:
+        report('coRoute, 1000 routes from a factory, maxRoutes=%s' %
+               maxRoutes,
+               bestOf(lambda: pushAll(values, coRoute(
+                   keyOf, {}, factory=lambda key: NullSink(),
+                   maxRoutes=maxRoutes))) / COUNT,
+               'ns')
+
+
+if __name__ == '__main__':
+    main()
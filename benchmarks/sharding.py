@@ -0,0 +1,44 @@
+""" Throughput of a CPU bound pure python pipeline, run in the calling
+process, and sharded across worker processes with coShard. """
+
+import os
+
+from generators_to_coroutines.sharding import coShard
+from generators_to_coroutines.tools import genMap, pushAll
+
+from . import NullSink, bestOf, report
+
+COUNT = 20000
+WORKERS = [1, 2, 4]
+BATCH_SIZES = [16, 256]
+
+
+def work(val):
+    total = 0
+    for i in range(200):
+        total += (val * i) % 7
+    return total
+
+
+def pipeline(target):
+    return genMap.co(work, target)
+
+
+def main():
+    values = list(range(COUNT))
+
+    print('%d CPUs, per value:' % (os.cpu_count() or 1))
+    report('in process', bestOf(
+        lambda: pushAll(values, pipeline(NullSink())), repeat=3) / COUNT,
+        'us')
+    for workers in WORKERS:
+        for batchSize in BATCH_SIZES:
+            report('coShard, %d workers, batches of %d' % (workers, batchSize),
+                   bestOf(lambda: pushAll(values, coShard(
+                       pipeline, NullSink(), workers, batchSize,
+                       ordered=True)), repeat=3) / COUNT,
+                   'us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+""" Throughput of handing values from a pipeline in one process to a pipeline
+in another: through a multiprocessing.Queue, one pickled value at a time, and
+through a SharedRing, as pickled values and as raw records. """
+
+import multiprocessing
+import pickle
+import time
+
+from generators_to_coroutines.shared_ring import SharedRing, coRingSend, \
+    pushFromRing
+from generators_to_coroutines.tools import genMap, pushAll
+
+from . import NullSink, report
+
+COUNT = 200000
+RING_SIZE = 1 << 20
+RECORD = b'0123456789abcdef'
+
+
+def values():
+    return [(val, 'value') for val in range(COUNT)]
+
+
+def records():
+    return [RECORD] * COUNT
+
+
+class QueueSender(object):
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def send(self, val):
+        self.queue.put(val)
+
+    def close(self):
+        self.queue.put(None)
+
+
+def sendToQueue(queue):
+    pushAll(values(), QueueSender(queue))
+
+
+def sendToRing(ring, makeValues, encode):
+    pushAll(makeValues(), coRingSend(ring, encode))
+
+
+def receiveFromQueue():
+    queue = multiprocessing.Queue(RING_SIZE // 64)
+    sender = multiprocessing.Process(target=sendToQueue, args=(queue,))
+    sender.start()
+    pushAll(iter(queue.get, None), genMap.co(len, NullSink()))
+    sender.join()
+
+
+def receiveFromRing(makeValues, encode, decode, recordSize=None):
+    ring = SharedRing(size=RING_SIZE, recordSize=recordSize)
+    try:
+        sender = multiprocessing.Process(
+            target=sendToRing, args=(ring, makeValues, encode))
+        sender.start()
+        pushFromRing(ring, genMap.co(len, NullSink()), decode)
+        sender.join()
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+def timePerValue(func):
+    times = []
+    for _ in range(3):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times) / COUNT
+
+
+def main():
+    print('Handing %d values to another process, per value:' % COUNT)
+    report('multiprocessing.Queue, pickled values',
+           timePerValue(receiveFromQueue), 'ns')
+    report('SharedRing, pickled values',
+           timePerValue(lambda: receiveFromRing(
+               values, pickle.dumps, pickle.loads)),
+           'ns')
+    report('SharedRing, %d byte records' % len(RECORD),
+           timePerValue(lambda: receiveFromRing(records, None, None)), 'ns')
+    report('SharedRing, fixed size %d byte records' % len(RECORD),
+           timePerValue(lambda: receiveFromRing(
+               records, None, None, len(RECORD))),
+           'ns')
+
+
+if __name__ == '__main__':
+    main()
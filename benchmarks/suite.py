@@ -0,0 +1,233 @@
+""" Benchmark suite covering pull (generator) and push (coroutine) pipelines,
+and the cost of conversion, with results that can be saved and compared
+against a baseline to catch regressions, e.g. in the generated code:
+
+    python -m benchmarks.suite --save baseline.json
+    ... change things ...
+    python -m benchmarks.suite --compare baseline.json
+
+Comparing exits with status 1 if any result is more than the tolerance worse
+than the baseline. All results are costs, so lower is better. """
+
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+from collections import deque
+
+from generators_to_coroutines import cache, tools
+from generators_to_coroutines.ast_transformers import InvertGenerator, \
+    clearTransformedCodes, transformAstWith
+
+from . import NullSink, bestOf, double, isOdd, report
+
+COUNT = 100000
+PIPELINES = 1000
+DEPTH = 10
+CONVERSIONS = 20
+REPEAT = 7
+
+
+# stages of the tools module, as (name, generator pipeline, coroutine
+# pipeline)
+def stages():
+    return [
+        ('genPassthrough', tools.genPassthrough, tools.genPassthrough.co),
+        ('genFilter',
+         lambda i: tools.genFilter(isOdd, i),
+         lambda t: tools.genFilter.co(isOdd, t)),
+        ('genMap',
+         lambda i: tools.genMap(double, i),
+         lambda t: tools.genMap.co(double, t)),
+        ('genPairs', tools.genPairs, tools.genPairs.co),
+    ]
+
+
+def examplePipelines():
+    """ The pipeline of the examples module, as a generator and as a
+    coroutine pipeline. """
+    return (
+        lambda i: tools.genPairs(tools.genMap(
+            double, tools.genFilter(isOdd, tools.genPassthrough(i)))),
+        lambda t: tools.genPassthrough.co(tools.genFilter.co(
+            isOdd, tools.genMap.co(double, tools.genPairs.co(t)))))
+
+
+def deepPipelines(depth):
+    """ depth passthrough stages, as a generator and as a coroutine
+    pipeline. """
+
+    def genDeep(iterable):
+        for _ in range(depth):
+            iterable = tools.genPassthrough(iterable)
+        return iterable
+
+    def coDeep(target):
+        for _ in range(depth):
+            target = tools.genPassthrough.co(target)
+        return target
+
+    return genDeep, coDeep
+
+
+def fanOutPipeline(target):
+    """ Split odd and even values into two pipelines. """
+    return tools.coSplit(
+        isOdd,
+        tools.genPairs.co(target),
+        tools.genMap.co(double, target))
+
+
+def pullTime(pipeline, values):
+    """ Seconds per value pulled through a generator pipeline. """
+    return bestOf(lambda: deque(pipeline(iter(values)), 0),
+                  repeat=REPEAT) / len(values)
+
+
+def pushTime(pipeline, values):
+    """ Seconds per value pushed through a coroutine pipeline. """
+    return bestOf(lambda: tools.pushAll(values, pipeline(NullSink())),
+                  repeat=REPEAT) / len(values)
+
+
+def memoryPerPipeline(pipeline):
+    """ Bytes allocated per coroutine pipeline instance. """
+    sink = NullSink()
+    tracemalloc.start()
+    pipelines = [pipeline(sink) for _ in range(PIPELINES)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del pipelines
+    return size / float(PIPELINES)
+
+
+def genConverted(iterable):
+    buf = []
+    for elem in iterable:
+        buf.append(elem)
+        if len(buf) >= 2:
+            yield tuple(buf)
+            buf = []
+
+
+def conversionTime():
+    """ Seconds per conversion of a generator by transformAstWith, without
+    memoization or persistent caching. """
+
+    def convert():
+        clearTransformedCodes()
+        transformAstWith(globals(), None, [InvertGenerator])(genConverted)
+
+    return bestOf(convert, repeat=REPEAT, number=CONVERSIONS)
+
+
+def run():
+    """ Run all benchmarks, returning a dictionary of results by name, each a
+    (value, unit) pair. """
+
+    cache.disableCache()
+    values = list(range(COUNT))
+    results = {}
+
+    def record(name, seconds, unit):
+        scale = {'s': 1.0, 'ms': 1e3, 'us': 1e6, 'ns': 1e9}[unit]
+        results[name] = (seconds * scale, unit)
+        report(name, seconds, unit)
+
+    for name, genPipeline, coPipeline in stages():
+        record('%s pull, per value' % name,
+               pullTime(genPipeline, values), 'ns')
+        record('%s push, per value' % name,
+               pushTime(coPipeline, values), 'ns')
+
+    genExample, coExample = examplePipelines()
+    record('example pipeline pull, per value',
+           pullTime(genExample, values), 'ns')
+    record('example pipeline push, per value',
+           pushTime(coExample, values), 'ns')
+
+    genDeep, coDeep = deepPipelines(DEPTH)
+    record('%d deep pipeline pull, per value' % DEPTH,
+           pullTime(genDeep, values), 'ns')
+    record('%d deep pipeline push, per value' % DEPTH,
+           pushTime(coDeep, values), 'ns')
+
+    record('coSplit fan-out push, per value',
+           pushTime(fanOutPipeline, values), 'ns')
+
+    record('transformAstWith conversion', conversionTime(), 'ms')
+
+    for name, pipeline in [('example pipeline', coExample),
+                           ('%d deep pipeline' % DEPTH, coDeep)]:
+        size = memoryPerPipeline(pipeline)
+        results['%s memory' % name] = (size, 'bytes')
+        print('%-50s %12d bytes' % ('%s memory' % name, size))
+
+    return results
+
+
+def save(results, fileName):
+    with open(fileName, 'w') as outputFile:
+        json.dump({
+            'python': platform.python_version(),
+            'results': dict(
+                (name, {'value': value, 'unit': unit})
+                for name, (value, unit) in results.items()),
+        }, outputFile, indent=2, sort_keys=True)
+
+
+def compare(results, fileName, tolerance):
+    """ Print the change of each result relative to the baseline, and return
+    the names of those worse by more than the tolerance (a fraction). """
+
+    with open(fileName) as inputFile:
+        baseline = json.load(inputFile)
+
+    print('Compared to %s (python %s):' % (fileName, baseline['python']))
+
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline['results']:
+            continue
+
+        value, unit = results[name]
+        baselineValue = baseline['results'][name]['value']
+        change = value / baselineValue - 1 if baselineValue else 0.0
+
+        regressed = change > tolerance
+        if regressed:
+            regressions.append(name)
+
+        print('%-50s %+8.1f%%%s' % (name, change * 100,
+                                    '  REGRESSION' if regressed else ''))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.suite',
+        description=__doc__.split('\n\n')[0])
+    parser.add_argument('--save', metavar='FILE',
+                        help='save the results as JSON')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare the results against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='fraction by which results may be worse than '
+                             'the baseline (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    results = run()
+
+    if args.save:
+        save(results, args.save)
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,32 @@
+""" Throughput of the windowing stages, pushed one value at a time, compared
+to genPairs. """
+
+from generators_to_coroutines.tools import genChunk, genPairs, \
+    genTimeWindow, genWindow, pushAll
+
+from . import NullSink, bestOf, report
+
+COUNT = 200000
+
+
+def main():
+    values = list(range(COUNT))
+
+    print('Pushing %d values, per value:' % COUNT)
+    for name, makeStage in [
+            ('genPairs', lambda: genPairs.co(NullSink())),
+            ('genChunk, 2', lambda: genChunk.co(2, NullSink())),
+            ('genChunk, 64', lambda: genChunk.co(64, NullSink())),
+            ('genWindow, 2 step 2', lambda: genWindow.co(2, NullSink(), 2)),
+            ('genWindow, 16 step 1',
+             lambda: genWindow.co(16, NullSink(), 1)),
+            ('genWindow, 64 step 16',
+             lambda: genWindow.co(64, NullSink(), 16)),
+            ('genTimeWindow, 1 ms',
+             lambda: genTimeWindow.co(0.001, NullSink()))]:
+        report(name, bestOf(lambda: pushAll(values, makeStage())) / COUNT,
+               'ns')
+
+
+if __name__ == '__main__':
+    main()
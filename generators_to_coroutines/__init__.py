@@ -1,2 +1,3 @@
-from .decorators import invertibleGenerator, hasInvertibleMethods
+from .decorators import invertibleGenerator, hasInvertibleMethods, \
+    enableLazyConversion, disableLazyConversion
 from . import tools
@@ -0,0 +1,82 @@
+""" Command line interface.
+
+    python -m generators_to_coroutines compile <package> [<package> ...]
+
+generates plain python modules containing the coroutine versions of all
+invertible generators in the given packages or modules (see the generated
+module).
+
+    python -m generators_to_coroutines source <module>:<function>
+
+prints the source of the coroutine version of a generator, e.g.
+"package.module:Class.gen". """
+
+import argparse
+import importlib
+import sys
+
+
+# transformers producing each form of an invertible generator
+_forms = {
+    'co': 'InvertGenerator',
+    'co_batch': 'InvertGeneratorBatched',
+    'co_object': 'InvertGeneratorToClass',
+    'aco': 'InvertGeneratorAsync',
+}
+
+
+def _findFunction(name):
+    """ Find a function given as "module:qualified.name". """
+
+    moduleName, _, qualifiedName = name.partition(':')
+    obj = importlib.import_module(moduleName)
+    for attr in qualifiedName.split('.'):
+        obj = vars(obj)[attr] if attr in vars(obj) else getattr(obj, attr)
+
+    # methods are wrapped in a descriptor (see descriptor_magic)
+    return getattr(obj, 'func', obj)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m generators_to_coroutines')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    compileParser = commands.add_parser(
+        'compile',
+        help='generate coroutine modules ahead of time')
+    compileParser.add_argument(
+        'packages', nargs='+', metavar='package',
+        help='name of a package or module to generate coroutines for')
+
+    sourceParser = commands.add_parser(
+        'source',
+        help='print the source of the coroutine version of a generator')
+    sourceParser.add_argument(
+        'function',
+        help='the generator, as module:name, e.g. package.module:Class.gen')
+    sourceParser.add_argument(
+        '--form', choices=sorted(_forms), default='co',
+        help='the form of the coroutine (default: %(default)s)')
+
+    arguments = parser.parse_args(argv)
+
+    if arguments.command == 'source':
+        from . import ast_transformers
+
+        sys.stdout.write(ast_transformers.invertedSource(
+            _findFunction(arguments.function),
+            [getattr(ast_transformers, _forms[arguments.form])]))
+        return 0
+
+    from .compiler import compilePackage
+
+    for name in arguments.packages:
+        for path in compilePackage(name):
+            print(path)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+""" Asynchronous push pipelines (python 3.6+).
+
+The aco form of an invertible generator is an asynchronous generator (see
+InvertGeneratorAsync), which awaits the asend() of its target instead of
+calling send(), so that targets can perform I/O without blocking the event
+loop. A single event loop can then drive many pipelines concurrently:
+
+    stage = genPairs.aco(writer)
+    await apushFromIterable(values, stage)
+
+where writer is any object with asend() and aclose() methods returning
+awaitables, e.g. another aco stage. """
+
+
+class AsyncStage(object):
+    """ Wraps an asynchronous generator converted from a generator, priming it
+    when it is first pushed a value or closed. Priming runs the statements
+    before the loop of the generator, which may await its target, so it
+    cannot be done when the stage is created. """
+
+    __slots__ = ('generator', 'asend')
+
+    def __init__(self, generator):
+        self.generator = generator
+        self.asend = self._primeAndSend
+
+    async def _prime(self):
+        await self.generator.asend(None)
+        self.asend = self.generator.asend
+
+    async def _primeAndSend(self, value):
+        await self._prime()
+        return await self.generator.asend(value)
+
+    async def aclose(self):
+        if self.asend == self._primeAndSend:
+            await self._prime()
+        await self.generator.aclose()
+
+
+def acoroutine(func):
+    """ Decorate an asynchronous generator function, so that it creates
+    AsyncStage objects. """
+
+    def start(*args, **kwargs):
+        return AsyncStage(func(*args, **kwargs))
+    return start
+
+
+async def apushFromIterable(iterable, target):
+    """ Push all values of an iterable, or of an asynchronous iterable, to an
+    asynchronous target, awaiting each push, and close it. """
+
+    try:
+        if hasattr(iterable, '__aiter__'):
+            async for elem in iterable:
+                await target.asend(elem)
+        else:
+            for elem in iterable:
+                await target.asend(elem)
+
+        await target.aclose()
+    except StopAsyncIteration:
+        pass
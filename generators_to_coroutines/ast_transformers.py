@@ -1,17 +1,32 @@
 import ast
 import inspect
 import copy
+import linecache
+import os
 import six
 import random
 import sys
 import textwrap
 
+from .cache import cacheKey, defaultCache
+from .transformed import TRANSFORMER_VERSION, bindFunction, findFunctionCode
+
 
 if sys.version_info[0] == 3 and sys.version_info[1] > 2:
     _TryNode = ast.Try
 else:
     _TryNode = ast.TryExcept
 
+if hasattr(ast, 'Constant'):
+    def _constantNode(value):
+        return ast.Constant(value=value)
+elif hasattr(ast, 'NameConstant'):
+    def _constantNode(value):
+        return ast.NameConstant(value=value)
+else:
+    def _constantNode(value):
+        return ast.Name(id=repr(value), ctx=ast.Load())
+
 if six.PY3:
     def getFunctionArgumentIdentifiers(node):
         return set(arg.arg for arg in node.args.args)
@@ -48,8 +63,8 @@ class AnalyzeGeneratorFunction(ast.NodeVisitor):
     def _doesCallHaveNoParameters(cls, callNode):
         return len(callNode.args) == 0 and \
             len(callNode.keywords) == 0 and \
-            callNode.starargs is None and \
-            callNode.kwargs is None
+            getattr(callNode, 'starargs', None) is None and \
+            getattr(callNode, 'kwargs', None) is None
 
     @classmethod
     def _doesCallInvokeMethod(cls, methodName, callNode):
@@ -173,6 +188,16 @@ class AnalyzeGeneratorFunction(ast.NodeVisitor):
         self.generic_visit(node)
 
 
+# Roles of the statements created by InvertGenerator, in their inversionRole
+# attribute, for use by later transformers (see InstrumentStages): receiving a
+# value pushed to the coroutine, and sending a value to the target, or lists
+# of values for InvertGeneratorBatched.
+RECEIVE = 'receive'
+SEND = 'send'
+RECEIVE_BATCH = 'receiveBatch'
+SEND_BATCH = 'sendBatch'
+
+
 class InvertGenerator(ast.NodeTransformer):
     """ Transform a function AST, from a generator into a coroutine (from pull
     to push). The iterable parameter to the generator that was pulled from, now
@@ -195,13 +220,20 @@ class InvertGenerator(ast.NodeTransformer):
             orelse=[],
             finalbody=[])
 
-    def _moreValuesAvailableAssignmentNode(self, loadId):
+    def _nonconflictingId(self, baseId):
+        """ Create an identifier that is not used in the generator. """
+        newId = baseId
+        while newId in self.analysis.loadedNames:
+            newId += str(random.randint(0, 1000000))
+        return newId
+
+    def _moreValuesAvailableAssignmentNode(self, value):
         return ast.Assign(
             targets=[ast.Name(id=self.moreValuesAvailableId, ctx=ast.Store())],
-            value=ast.Name(id=loadId, ctx=ast.Load()))
+            value=_constantNode(value))
 
     def visit_FunctionDef(self, node):
-        node.body.insert(0, self._moreValuesAvailableAssignmentNode('True'))
+        node.body.insert(0, self._moreValuesAvailableAssignmentNode(True))
         return self.generic_visit(node)
 
     def visit(self, node):
@@ -218,9 +250,8 @@ class InvertGenerator(ast.NodeTransformer):
                     "the Generator. Conversion to a Coroutine cannot be done.")
 
             self.loopsToBeWrapped = copy.copy(self.analysis.loopsToBeConverted)
-            self.moreValuesAvailableId = "moreValuesAvailable"
-            while self.moreValuesAvailableId in self.analysis.loadedNames:
-                self.moreValuesAvailableId += str(random.randint(0, 1000000))
+            self.moreValuesAvailableId = \
+                self._nonconflictingId("moreValuesAvailable")
 
         if node in self.analysis.nodesToBeDeleted:
             return ast.Pass()
@@ -244,8 +275,7 @@ class InvertGenerator(ast.NodeTransformer):
             # While(expr test, stmt* body, stmt* orelse)
 
             # prepend statement to await a value in the coroutine
-            newbody = [ast.Assign(targets=[node.target],
-                                  value=ast.Yield(value=None))] + node.body
+            newbody = [self._receiveAssignment(node.target)] + node.body
             whileNode = ast.While(
                 test=ast.Name(id=self.moreValuesAvailableId, ctx=ast.Load()),
                 body=newbody,
@@ -253,27 +283,43 @@ class InvertGenerator(ast.NodeTransformer):
 
             newnode = self._tryExceptGeneratorExit(
                 [whileNode],
-                [self._moreValuesAvailableAssignmentNode('False')])
+                [self._moreValuesAvailableAssignmentNode(False)])
 
         self.generic_visit(newnode)
 
         return ast.copy_location(newnode, node)
 
-    def _coroutineSendExpression(self, target, exprToSend):
+    def _methodCallExpression(self, obj, methodName, argument):
         """ Create an expression like
-            target.send(exprToSend)
+            obj.methodName(argument)
         """
         return ast.Expr(value=ast.Call(
             func=ast.Attribute(
-                value=target,
-                attr='send',
+                value=obj,
+                attr=methodName,
                 ctx=ast.Load()),
-            args=[exprToSend],
+            args=[argument],
             keywords=[],
             starargs=None,
             kwargs=None
             ))
 
+    def _receiveAssignment(self, target):
+        """ Create a statement like
+            target = (yield)
+        """
+        node = ast.Assign(targets=[target], value=ast.Yield(value=None))
+        node.inversionRole = RECEIVE
+        return node
+
+    def _coroutineSendExpression(self, target, exprToSend):
+        """ Create an expression like
+            target.send(exprToSend)
+        """
+        node = self._methodCallExpression(target, 'send', exprToSend)
+        node.inversionRole = SEND
+        return node
+
     def _extractValueFromYieldExpr(self, expr):
 
         if isinstance(expr.value, ast.Yield):
@@ -295,9 +341,513 @@ class InvertGenerator(ast.NodeTransformer):
         return newnode
 
 
+class InvertGeneratorAsync(InvertGenerator):
+    """ Transform a function AST, from a generator into an asynchronous
+    generator that is pushed values with asend(), and awaits the asend() of
+    its target instead of calling send() (python 3.6+, see the aio module).
+
+    Unlike generators, asynchronous generators are not finalized when they
+    are no longer referenced, so closing the asynchronous generator also
+    closes its target. """
+
+    def visit_FunctionDef(self, node):
+        node = super(InvertGeneratorAsync, self).visit_FunctionDef(node)
+
+        closeExpression = ast.Expr(value=ast.Await(value=ast.Call(
+            func=ast.Attribute(
+                value=self.analysis.target,
+                attr='aclose',
+                ctx=ast.Load()),
+            args=[],
+            keywords=[])))
+        node.body = [ast.Try(body=node.body, handlers=[], orelse=[],
+                             finalbody=[closeExpression])]
+
+        return ast.copy_location(
+            ast.AsyncFunctionDef(**dict(ast.iter_fields(node))), node)
+
+    def _coroutineSendExpression(self, target, exprToSend):
+        """ Create an expression like
+            await target.asend(exprToSend)
+        """
+        sendExpression = self._methodCallExpression(
+            target, 'asend', exprToSend)
+        sendExpression.value = ast.Await(value=sendExpression.value)
+        sendExpression.inversionRole = SEND
+        return sendExpression
+
+
+class FindLoopExits(ast.NodeVisitor):
+    """ Find break and return statements that exit the loop whose body is
+    visited, and optionally continue statements that skip the rest of it. """
+
+    def __init__(self, includeContinue=False):
+        self.found = False
+        self.loopDepth = 0
+        self.includeContinue = includeContinue
+
+    def visit_Break(self, node):
+        if self.loopDepth == 0:
+            self.found = True
+
+    def visit_Continue(self, node):
+        if self.includeContinue and self.loopDepth == 0:
+            self.found = True
+
+    def visit_Return(self, node):
+        self.found = True
+
+    def _visitLoop(self, node):
+        self.loopDepth += 1
+        for stmt in node.body:
+            self.visit(stmt)
+        self.loopDepth -= 1
+
+        for stmt in node.orelse:
+            self.visit(stmt)
+
+    visit_For = _visitLoop
+    visit_While = _visitLoop
+
+    def _skip(self, node):
+        pass
+
+    visit_FunctionDef = _skip
+    visit_ClassDef = _skip
+    visit_Lambda = _skip
+
+
+class InvertGeneratorBatched(InvertGenerator):
+    """ Transform a function AST, from a generator into a coroutine that is
+    pushed lists of values at a time, and pushes lists of values to its target.
+
+    The body of each loop over the iterable is run over a whole list of
+    values, collecting the values it yields into a list that is sent on at
+    the end. Values yielded outside of such loops are sent on as lists of one.
+    Loops that are exited early with break or return, and explicit iterator
+    next() calls cannot be converted. """
+
+    def __init__(self):
+        super(InvertGeneratorBatched, self).__init__()
+        self.batchInId = None
+        self.batchOutId = None
+        self.batchLoopDepth = 0
+
+    def visit_FunctionDef(self, node):
+        if self.batchInId is None:
+            if self.analysis.nextCallsToBeConverted:
+                raise Exception(
+                    "Generators that call next() on their iterable cannot be "
+                    "converted to a batched Coroutine.")
+
+            self.batchInId = self._nonconflictingId("batchIn")
+            self.batchOutId = self._nonconflictingId("batchOut")
+
+        return super(InvertGeneratorBatched, self).visit_FunctionDef(node)
+
+    def _receiveAssignment(self, target):
+        node = super(InvertGeneratorBatched, self)._receiveAssignment(target)
+        node.inversionRole = RECEIVE_BATCH
+        return node
+
+    def _coroutineSendExpression(self, target, exprToSend):
+        node = super(InvertGeneratorBatched, self)._coroutineSendExpression(
+            target, exprToSend)
+        node.inversionRole = SEND_BATCH
+        return node
+
+    def visit_For(self, node):
+        """ Change iteration into while-yield statements, and iteration over
+        each batch received """
+
+        if node not in self.analysis.loopsToBeConverted:
+            return super(InvertGeneratorBatched, self).visit_For(node)
+
+        exits = FindLoopExits()
+        for stmt in node.body:
+            exits.visit(stmt)
+        if exits.found:
+            raise Exception(
+                "Loops exited with break or return cannot be converted to a "
+                "batched Coroutine.")
+
+        batchLoop = ast.For(
+            target=node.target,
+            iter=ast.Name(id=self.batchInId, ctx=ast.Load()),
+            body=node.body,
+            orelse=[])
+
+        self.batchLoopDepth += 1
+        self.generic_visit(batchLoop)
+        self.batchLoopDepth -= 1
+
+        whileNode = ast.While(
+            test=ast.Name(id=self.moreValuesAvailableId, ctx=ast.Load()),
+            body=[
+                self._receiveAssignment(
+                    ast.Name(id=self.batchInId, ctx=ast.Store())),
+                ast.Assign(
+                    targets=[ast.Name(id=self.batchOutId, ctx=ast.Store())],
+                    value=ast.List(elts=[], ctx=ast.Load())),
+                batchLoop,
+                ast.If(
+                    test=ast.Name(id=self.batchOutId, ctx=ast.Load()),
+                    body=[self._coroutineSendExpression(
+                        self.analysis.target,
+                        ast.Name(id=self.batchOutId, ctx=ast.Load()))],
+                    orelse=[]),
+            ],
+            orelse=[])
+
+        newnode = self._tryExceptGeneratorExit(
+            [whileNode],
+            [self._moreValuesAvailableAssignmentNode(False)])
+
+        return ast.copy_location(newnode, node)
+
+    def visit_Expr(self, node):
+
+        yieldValue = self._extractValueFromYieldExpr(node)
+        if yieldValue is None:
+            return super(InvertGeneratorBatched, self).visit_Expr(node)
+
+        if self.batchLoopDepth:
+            newnode = self._methodCallExpression(
+                ast.Name(id=self.batchOutId, ctx=ast.Load()),
+                'append',
+                yieldValue)
+        else:
+            newnode = self._coroutineSendExpression(
+                self.analysis.target,
+                ast.List(elts=[yieldValue], ctx=ast.Load()))
+
+        self.generic_visit(newnode)
+        return newnode
+
+
+def findSingleLoop(funcNode, analysis, conversion):
+    """ Check that a generator pulls from its iterable in a single loop only,
+    which is a statement of the function body, without any yield before it,
+    and without break or return exiting it. Yield must only be used as a
+    statement, and there must be no nested functions or classes. Returns the
+    loop; raises an Exception, mentioning the given kind of conversion,
+    otherwise. """
+
+    def fail(reason):
+        raise Exception("%s cannot be %s: %s." %
+                        (funcNode.name, conversion, reason))
+
+    if len(analysis.loopsToBeConverted) != 1 or \
+            analysis.nextCallsToBeConverted or analysis.nodesToBeDeleted:
+        fail("it must pull from its iterable in a single loop")
+
+    loop = next(iter(analysis.loopsToBeConverted))
+    if loop not in funcNode.body:
+        fail("its loop over the iterable must be a statement of the "
+             "function body")
+
+    exits = FindLoopExits(includeContinue=True)
+    for stmt in loop.body:
+        exits.visit(stmt)
+    if exits.found:
+        fail("its loop over the iterable is exited with break, continue or "
+             "return")
+
+    prelude = funcNode.body[:funcNode.body.index(loop)]
+    for stmt in prelude:
+        for node in ast.walk(stmt):
+            if isinstance(node, ast.Yield):
+                fail("it yields before its loop")
+
+    yieldStatements = set(
+        node.value for node in ast.walk(funcNode)
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Yield))
+
+    unsupported = (ast.FunctionDef, ast.ClassDef, ast.Lambda, ast.Global) + \
+        tuple(getattr(ast, nodeType) for nodeType in
+              ('Nonlocal', 'YieldFrom', 'Await', 'AsyncFunctionDef')
+              if hasattr(ast, nodeType))
+    for node in ast.walk(funcNode):
+        if node is funcNode:
+            continue
+        if isinstance(node, unsupported):
+            fail("it uses %s" % type(node).__name__)
+        if isinstance(node, ast.Yield) and node not in yieldStatements:
+            fail("it uses yield as an expression")
+
+    return loop
+
+
+def _allArgumentIds(funcNode):
+    arguments = funcNode.args
+    ids = set(getFunctionArgumentIdentifiers(funcNode))
+    for arg in getattr(arguments, 'kwonlyargs', []):
+        ids.add(arg.arg)
+    for arg in (arguments.vararg, arguments.kwarg):
+        if arg is not None:
+            ids.add(getattr(arg, 'arg', arg))
+    return ids
+
+
+class _LocalsToAttributes(ast.NodeTransformer):
+    """ Replace variables with attributes of an instance. """
+
+    def __init__(self, instanceId, attributes):
+        self.instanceId = instanceId
+        self.attributes = attributes
+
+    def visit_Name(self, node):
+        if node.id not in self.attributes:
+            return node
+
+        return ast.copy_location(
+            ast.Attribute(
+                value=ast.Name(id=self.instanceId, ctx=ast.Load()),
+                attr=self.attributes[node.id],
+                ctx=node.ctx),
+            node)
+
+
+class InvertGeneratorToClass(InvertGenerator):
+    """ Transform a function AST, from a generator into a function returning
+    an equivalent push object class.
+
+    Instances are constructed with the arguments of the generator, the target
+    taking the place of the iterable, and run the statements before the loop
+    over the iterable. send() runs the body of the loop for one value, and
+    close() runs the statements after the loop. The variables of the
+    generator become attributes, stored in __slots__. Like closing a
+    coroutine, closing drops the reference to the target, after which send()
+    raises StopIteration and close() does nothing. Only generators with a
+    single simple loop can be converted (see findSingleLoop). """
+
+    _methodNames = ('send', 'close')
+
+    def visit_FunctionDef(self, node):
+        loop = findSingleLoop(node, self.analysis, "converted to a class")
+
+        loopIndex = node.body.index(loop)
+        prelude = node.body[:loopIndex]
+        postlude = node.body[loopIndex + 1:]
+
+        argumentIds = _allArgumentIds(node)
+        localIds = set(argumentIds)
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name) and \
+                    not isinstance(child.ctx, ast.Load):
+                localIds.add(child.id)
+
+        # a loop variable only used in the loop stays local to send()
+        valueId = None
+        if isinstance(loop.target, ast.Name):
+            outside = [
+                child for stmt in prelude + postlude
+                for child in ast.walk(stmt)
+                if isinstance(child, ast.Name) and child.id == loop.target.id]
+            if not outside and loop.target.id not in argumentIds:
+                valueId = loop.target.id
+                localIds.discard(valueId)
+
+        usedIds = localIds | self.analysis.loadedNames
+        instanceId = 'self'
+        while instanceId in usedIds or instanceId == valueId:
+            instanceId += '_'
+        if valueId is None:
+            valueId = 'value'
+            while valueId in usedIds or valueId == instanceId:
+                valueId += '_'
+            loop.body.insert(0, ast.Assign(
+                targets=[loop.target],
+                value=ast.Name(id=valueId, ctx=ast.Load())))
+
+        attributes = {}
+        for localId in localIds:
+            attribute = localId
+            while attribute in self._methodNames or \
+                    (attribute != localId and attribute in localIds):
+                attribute = '_' + attribute
+            attributes[localId] = attribute
+
+        toAttributes = _LocalsToAttributes(instanceId, attributes)
+
+        def convert(statements):
+            # yields become sends to the target, then variables attributes
+            return [toAttributes.visit(self.visit(stmt))
+                    for stmt in statements]
+
+        prelude = convert(prelude)
+        body = convert(loop.body)
+        postlude = convert(postlude)
+
+        template = ast.parse(textwrap.dedent('''
+            def %(name)s():
+                class %(name)s(object):
+                    __slots__ = %(slots)r
+
+                    def __init__(%(self)s):
+                        pass
+
+                    def send(%(self)s, %(value)s):
+                        if %(self)s.%(target)s is None:
+                            raise StopIteration
+
+                    def close(%(self)s):
+                        if %(self)s.%(target)s is not None:
+                            try:
+                                pass
+                            finally:
+                                %(self)s.%(target)s = None
+
+                return %(name)s
+            ''' % {
+                'name': node.name,
+                'slots': tuple(sorted(attributes.values())),
+                'self': instanceId,
+                'value': valueId,
+                'target': attributes[self.analysis.target.id],
+            })).body[0]
+
+        classNode = template.body[0]
+        init, send, close = classNode.body[1:]
+
+        if ast.get_docstring(node) is not None:
+            classNode.body.insert(0, prelude.pop(0))
+
+        # defaults are set from the original function once the class exists
+        instanceArgument = init.args.args[0]
+        init.args = copy.deepcopy(node.args)
+        init.args.defaults = []
+        if hasattr(init.args, 'kw_defaults'):
+            init.args.kw_defaults = [None] * len(init.args.kw_defaults)
+        init.args.args.insert(0, instanceArgument)
+
+        init.body = [
+            ast.Assign(
+                targets=[toAttributes.visit(
+                    ast.Name(id=argumentId, ctx=ast.Store()))],
+                value=ast.Name(id=argumentId, ctx=ast.Load()))
+            for argumentId in sorted(argumentIds)] + prelude or [ast.Pass()]
+        send.body.extend(body)
+        close.body[0].body[0].body = postlude or [ast.Pass()]
+
+        return ast.copy_location(template, node)
+
+
+class InstrumentStages(ast.NodeTransformer):
+    """ Instrument a function transformed by InvertGenerator (or one of its
+    subclasses), to record statistics of the stage in the instrumentation
+    module: values received and sent on, time spent handling received values,
+    and time spent in the target. Uses the statements marked by their
+    inversionRole; values received through converted next() calls are not
+    counted, and the values in the lists received and sent by batched
+    coroutines are.
+
+    Statistics are recorded under the name of the function, or under the
+    stage name of the subclasses made by named(). """
+
+    _package = __name__.rpartition('.')[0]
+
+    stageName = None
+    _named = {}
+
+    def __init__(self):
+        self.ids = None
+
+    @classmethod
+    def named(cls, stageName):
+        """ Return the subclass recording statistics under the given stage
+        name, e.g. the qualified name of the generator, so that methods of
+        different classes are told apart. There is one subclass per name, so
+        that it memoizes like any other transformer. """
+
+        subclass = cls._named.get(stageName)
+        if subclass is None:
+            subclass = cls._named[stageName] = type(
+                cls.__name__, (cls,), {'stageName': stageName})
+        return subclass
+
+    def _statements(self, template, node):
+        statements = ast.parse(template % self.ids).body
+        for stmt in statements:
+            for child in ast.walk(stmt):
+                ast.copy_location(child, node)
+        return statements
+
+    def visit_FunctionDef(self, node):
+        if self.ids is not None:
+            # only the transformed function itself is instrumented
+            return node
+
+        usedIds = set(
+            child.id for child in ast.walk(node)
+            if isinstance(child, ast.Name))
+        self.ids = {'package': self._package,
+                    'name': self.stageName or node.name}
+        for role in ('stats', 'timer', 'resumed', 'sent', 'value'):
+            newId = '_' + role
+            while newId in usedIds:
+                newId += '_'
+            self.ids[role] = newId
+
+        self.generic_visit(node)
+
+        node.body = self._statements(
+            'from %(package)s.instrumentation import stageStats as %(stats)s, '
+            'timer as %(timer)s\n'
+            '%(stats)s = %(stats)s(__name__, %(name)r)\n'
+            '%(resumed)s = %(timer)s()\n', node) + node.body
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Assign(self, node):
+        role = getattr(node, 'inversionRole', None)
+        if role not in (RECEIVE, RECEIVE_BATCH):
+            return self.generic_visit(node)
+
+        if role == RECEIVE_BATCH:
+            received = 'len(%s)' % node.targets[0].id
+        else:
+            received = '1'
+
+        return self._statements(
+            '%(stats)s.totalTime += %(timer)s() - %(resumed)s\n', node) + \
+            [node] + \
+            self._statements(
+                '%(resumed)s = %(timer)s()\n'
+                '%(stats)s.elementsIn += ' + received + '\n', node)
+
+    def visit_Expr(self, node):
+        role = getattr(node, 'inversionRole', None)
+        if role not in (SEND, SEND_BATCH):
+            return self.generic_visit(node)
+
+        call = node.value
+        if not isinstance(call, ast.Call):
+            # await target.asend(value)
+            call = call.value
+
+        valueAssignment = ast.copy_location(ast.Assign(
+            targets=[ast.Name(id=self.ids['value'], ctx=ast.Store())],
+            value=call.args[0]), node)
+        call.args = [ast.Name(id=self.ids['value'], ctx=ast.Load())]
+
+        return [valueAssignment] + \
+            self._statements('%(sent)s = %(timer)s()\n', node) + \
+            [node] + \
+            self._statements(
+                '%(stats)s.downstreamTime += %(timer)s() - %(sent)s\n'
+                '%(stats)s.elementsOut += ' +
+                ('len(%(value)s)' if role == SEND_BATCH else '1') + '\n',
+                node)
+
+
 class RemoveDecorators(ast.NodeTransformer):
 
     def visit_FunctionDef(self, node):
+        # the code of a decorated function starts at its first decorator
+        if node.decorator_list:
+            node.lineno = min(d.lineno for d in node.decorator_list)
         node.decorator_list = []
         return node
 
@@ -306,37 +856,202 @@ class RemoveDecorators(ast.NodeTransformer):
         return node
 
 
-def transformAstWith(globalEnv, localEnv, transformers):
-    """ Create a decorator that transforms functions in a given global
-    environment, using the provided NodeTransformer classes """
+def wrapInClosure(funcNode, freeVariables):
+    """ Nest a function definition inside a function taking the given free
+    variables as parameters, so they compile as closure cells rather than as
+    globals. """
 
-    # Always remove decorators when transforming
-    # TODO: necessary?
-    transformers.insert(0, RemoveDecorators)
+    wrapper = ast.parse('def _closure(%s):\n    pass\n' %
+                        ', '.join(freeVariables))
+    wrapper.body[0].body = [funcNode]
+    return wrapper
 
-    def transformDecorator(func):
-        funcName = func.__name__
 
-        node = ast.parse(textwrap.dedent(inspect.getsource(func)))
+def _functionSource(func):
+    """ Return the dedented source of a function, and its first line number
+    in its source file. """
+
+    lines, firstLine = inspect.getsourcelines(func)
+    return textwrap.dedent(''.join(lines)), firstLine
+
+
+def _parseFunction(source, firstLine, transformers):
+    """ Parse the source of a function, with the line numbers of its source
+    file, and transform it. Returns the transformed module AST. """
+
+    node = ast.parse(source)
+    ast.increment_lineno(node, firstLine - 1)
+
+    #print "BEFORE: "
+    #print astpp.dump(node)
+
+    for transformer in transformers:
+        node = transformer().visit(node)
+
+    #print "AFTER: "
+    #print astpp.dump(node)
+
+    return node
+
+
+def invertedSource(func, transformers=None):
+    """ Return the source of the transformed version of a function, by default
+    its coroutine version, e.g. to inspect what a coroutine actually runs.
+    Requires python 3.9 or later. """
+
+    if not hasattr(ast, 'unparse'):
+        raise Exception(
+            "Generating the inverted source requires python 3.9 or later.")
 
-        #print "BEFORE: "
-        #print astpp.dump(node)
+    transformers = [RemoveDecorators] + list(transformers or [InvertGenerator])
+    source, firstLine = _functionSource(func)
+    node = _parseFunction(source, firstLine, transformers)
 
-        for transformer in transformers:
-            node = transformer().visit(node)
+    return ast.unparse(ast.fix_missing_locations(node)) + '\n'
 
-        #print "AFTER: "
-        #print astpp.dump(node)
 
-        ast.fix_missing_locations(node)
-        compiled = compile(node, '<string>', 'exec')
+# Whether to compile transformed functions from their inverted source,
+# registered with linecache, rather than from their AST with the locations of
+# the original source (see enableSourceDebugging).
+_sourceDebugging = \
+    os.environ.get('GENERATORS_TO_COROUTINES_DEBUG', '') not in ('', '0')
 
-        tempNamespace = copy.copy(localEnv)
-        six.exec_(
-            compiled,
-            copy.copy(globalEnv),
-            tempNamespace)
 
-        return tempNamespace[funcName]
+def enableSourceDebugging():
+    """ Compile subsequently transformed functions from their inverted
+    source, so that tracebacks and debuggers show the code that is actually
+    run, rather than the original generator source. Requires python 3.9 or
+    later. """
+    global _sourceDebugging
+    _sourceDebugging = True
+
+
+def disableSourceDebugging():
+    """ Compile subsequently transformed functions with the file name and
+    line numbers of the original generator source (the default). """
+    global _sourceDebugging
+    _sourceDebugging = False
+
+
+def _compileDebugSource(node, func):
+    """ Compile a transformed module AST from its unparsed source, registered
+    with linecache under a file name identifying the original function. """
+
+    source = ast.unparse(node) + '\n'
+    originalCode = six.get_function_code(func)
+    fileName = '<coroutine %s at %s:%d>' % (
+        func.__name__, originalCode.co_filename, originalCode.co_firstlineno)
+
+    linecache.cache[fileName] = (
+        len(source), None, source.splitlines(True), fileName)
+
+    return compile(source, fileName, 'exec')
+
+
+def _transformToCode(func, transformers, codeCache):
+    """ Transform the source of a function, returning the code object of the
+    transformed function. It has the file name and line numbers of the
+    original function, so that profilers and tracebacks point to the
+    generator source, unless source debugging is enabled. """
+
+    funcName = func.__name__
+    originalCode = six.get_function_code(func)
+    freeVariables = originalCode.co_freevars
+
+    if _sourceDebugging:
+        codeCache = None
+
+    source, firstLine = _functionSource(func)
+
+    if codeCache is not None:
+        key = cacheKey(source, transformers, TRANSFORMER_VERSION,
+                       (originalCode.co_filename, firstLine))
+        code = codeCache.load(func, key, transformers)
+        if code is not None:
+            return code
+
+    node = _parseFunction(source, firstLine, transformers)
+
+    if freeVariables:
+        node = wrapInClosure(node.body[0], freeVariables)
+
+    ast.fix_missing_locations(node)
+    if _sourceDebugging:
+        moduleCode = _compileDebugSource(node, func)
+    else:
+        moduleCode = compile(node, originalCode.co_filename, 'exec')
+    code = findFunctionCode(moduleCode, funcName)
+
+    if codeCache is not None:
+        codeCache.store(func, key, transformers, code)
+
+    return code
+
+
+# Transformed code objects, keyed on the code object of the original function
+# and the transformers applied. Functions defined repeatedly, e.g. inside a
+# factory function, are only transformed once.
+_transformedCodes = {}
+
+# Transformed code objects registered ahead of time, before the original
+# function exists, keyed on the location of the original function's code and
+# the transformers applied. Each entry is moved to _transformedCodes on first
+# use.
+_transformedCodesByLocation = {}
+
+
+def clearTransformedCodes():
+    """ Forget the memoized transformed code, so that functions decorated
+    from now on are transformed again, or loaded from the persistent cache.
+    Code registered ahead of time is kept. """
+    _transformedCodes.clear()
+
+
+def _codeLocation(code):
+    return (os.path.normcase(os.path.abspath(code.co_filename)),
+            code.co_firstlineno,
+            code.co_name)
+
+
+def registerTransformedCode(code, transformers):
+    """ Register transformed code for the function whose original code has
+    the same file name, first line number and name, to be used instead of
+    transforming its source when it is decorated. """
+
+    _transformedCodesByLocation[
+        (_codeLocation(code), tuple(transformers))] = code
+
+
+def transformAstWith(globalEnv, localEnv, transformers, cache=None):
+    """ Create a decorator that transforms functions in a given global
+    environment, using the provided NodeTransformer classes.
+
+    The transformed function shares the defaults and closure of the original
+    function. localEnv is no longer needed for this, and is only accepted for
+    backwards compatibility.
+
+    Transformed code is memoized per original code object, and looked up in,
+    and stored to, the given CodeCache, or the default cache if none is given
+    (see the cache module). """
+
+    # Always remove decorators when transforming
+    # TODO: necessary?
+    transformers.insert(0, RemoveDecorators)
+
+    def transformDecorator(func):
+        memoKey = (six.get_function_code(func), tuple(transformers),
+                   _sourceDebugging)
+
+        code = _transformedCodes.get(memoKey)
+        if code is None:
+            code = _transformedCodesByLocation.pop(
+                (_codeLocation(memoKey[0]), memoKey[1]), None)
+            if code is None:
+                code = _transformToCode(
+                    func, transformers,
+                    cache if cache is not None else defaultCache())
+            _transformedCodes[memoKey] = code
+
+        return bindFunction(code, func, globalEnv)
 
     return transformDecorator
@@ -0,0 +1,159 @@
+""" Persistent on-disk cache of code objects produced by AST transformation.
+
+Similar in spirit to __pycache__: transformed code objects are marshalled to
+disk, keyed on everything that influences the result (the function source, the
+interpreter version, and the transformers used). A mismatching key means the
+entry is stale, and it is overwritten with a freshly transformed version.
+
+The cache is opt-in. Enable it either by setting the environment variable
+GENERATORS_TO_COROUTINES_CACHE before importing any decorated modules (to "1"
+to store entries in a __pycache__ directory next to each source file, or to a
+directory path to store all entries there), or programmatically with
+enableCache(). """
+
+import hashlib
+import marshal
+import os
+import re
+import sys
+import tempfile
+
+import six
+
+
+CACHE_ENVIRONMENT_VARIABLE = 'GENERATORS_TO_COROUTINES_CACHE'
+CACHE_SUFFIX = '.g2c'
+
+try:
+    from importlib.util import MAGIC_NUMBER as _MAGIC_NUMBER
+except ImportError:
+    import imp
+    _MAGIC_NUMBER = imp.get_magic()
+
+_unsafeFileCharacters = re.compile(r'[^A-Za-z0-9_.]')
+
+
+def _qualifiedName(func):
+    return getattr(func, '__qualname__', func.__name__)
+
+
+def cacheKey(source, transformers, version, location=None):
+    """ Compute a key identifying the result of transforming the given source
+    with the given transformer classes, on the running interpreter. The
+    location, a (file name, first line number) pair, is part of the key if
+    given, as the code records it. """
+
+    digest = hashlib.sha1()
+    for part in [str(version), sys.version, repr(_MAGIC_NUMBER)] + \
+            ['%s.%s' % (t.__module__, t.__name__) for t in transformers] + \
+            [source] + ([repr(location)] if location is not None else []):
+        digest.update(part.encode('utf-8') if isinstance(part, six.text_type)
+                      else part)
+        digest.update(b'\0')
+
+    return digest.hexdigest()
+
+
+class CodeCache(object):
+    """ Stores transformed code objects on disk.
+
+    If directory is None, entries are stored in a __pycache__ directory next to
+    the source file of each transformed function. """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+
+    def _path(self, func, transformers):
+        directory = self.directory
+        if directory is None:
+            sourceFile = getattr(six.get_function_code(func), 'co_filename',
+                                 None)
+            if not sourceFile or not os.path.isfile(sourceFile):
+                return None
+            directory = os.path.join(os.path.dirname(sourceFile),
+                                     '__pycache__')
+
+        # each transformer list gets its own entry, so that e.g. the co and
+        # co_batch versions of a function do not replace each other
+        fileName = _unsafeFileCharacters.sub('_', '.'.join(
+            [func.__module__, _qualifiedName(func)] +
+            ['-'.join(t.__name__ for t in transformers)]))
+        return os.path.join(directory, fileName + CACHE_SUFFIX)
+
+    def load(self, func, key, transformers):
+        """ Return the cached code object for func transformed by the given
+        transformer classes if its key matches, or None if there is no valid
+        entry. """
+
+        path = self._path(func, transformers)
+        if path is None:
+            return None
+
+        try:
+            with open(path, 'rb') as cacheFile:
+                storedKey = cacheFile.readline().rstrip(b'\n')
+                if storedKey != key.encode('ascii'):
+                    return None
+                return marshal.loads(cacheFile.read())
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def store(self, func, key, transformers, code):
+        """ Write code to the entry for func transformed by the given
+        transformer classes, replacing any stale entry. Failure to write is
+        silently ignored, as with bytecode caching. """
+
+        path = self._path(func, transformers)
+        if path is None:
+            return
+
+        directory = os.path.dirname(path)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+            # write to a temporary file first, so concurrent readers never
+            # observe a partially written entry
+            fd, tempPath = tempfile.mkstemp(dir=directory,
+                                            suffix=CACHE_SUFFIX + '.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as cacheFile:
+                    cacheFile.write(key.encode('ascii') + b'\n')
+                    cacheFile.write(marshal.dumps(code))
+                getattr(os, 'replace', os.rename)(tempPath, path)
+            except Exception:
+                os.remove(tempPath)
+                raise
+        except (IOError, OSError):
+            pass
+
+
+def _cacheFromEnvironment():
+    setting = os.environ.get(CACHE_ENVIRONMENT_VARIABLE, '')
+    if setting in ('', '0'):
+        return None
+    if setting == '1':
+        return CodeCache()
+    return CodeCache(setting)
+
+
+_defaultCache = _cacheFromEnvironment()
+
+
+def defaultCache():
+    """ Return the cache used when none is given explicitly, or None if
+    caching is disabled. """
+    return _defaultCache
+
+
+def enableCache(directory=None):
+    """ Enable the default cache for all subsequent transformations. """
+    global _defaultCache
+    _defaultCache = CodeCache(directory)
+    return _defaultCache
+
+
+def disableCache():
+    """ Disable the default cache. """
+    global _defaultCache
+    _defaultCache = None
@@ -0,0 +1,189 @@
+""" Ahead-of-time conversion of invertible generators into plain python
+modules, for use without any AST rewriting at runtime (see the generated
+module). Source is generated with ast.unparse, which requires python 3.9 or
+later; the generated modules themselves work with any supported version. """
+
+import ast
+import os
+
+try:
+    from importlib.util import find_spec
+except ImportError:
+    find_spec = None
+
+from .ast_transformers import \
+    InvertGenerator, RemoveDecorators, wrapInClosure
+from .generated import GENERATED_PACKAGE, generatedPath, sourceHash
+from .modules import FindInvertibleGenerators, findSourceFile
+from .transformed import TRANSFORMER_VERSION, iterateCodes
+
+
+_header = '''""" Coroutines generated by generators_to_coroutines from %(source)s.
+
+Do not edit. Regenerate with "python -m generators_to_coroutines compile". """
+
+from generators_to_coroutines.transformed import findFunctionCode
+
+SOURCE_HASH = %(hash)r
+TRANSFORMER_VERSION = %(version)r
+
+codes = {}
+'''
+
+_packageHeader = '''""" Coroutines generated by generators_to_coroutines. Do not edit. """
+'''
+
+
+def _firstLine(funcNode):
+    """ The first line number of the code compiled from a function definition,
+    which includes its decorators. """
+    return min([funcNode.lineno] + [d.lineno for d in funcNode.decorator_list])
+
+
+def _removeDefaultsAndAnnotations(funcNode):
+    """ Defaults are taken from the original function, and annotations are
+    not needed by its code, so neither must be evaluated in the generated
+    module, where the names they use are not defined. """
+    arguments = funcNode.args
+    arguments.defaults = []
+    arguments.kw_defaults = [None] * len(arguments.kw_defaults)
+
+    for argument in arguments.posonlyargs + arguments.args + \
+            arguments.kwonlyargs + [arguments.vararg, arguments.kwarg]:
+        if argument is not None:
+            argument.annotation = None
+    funcNode.returns = None
+
+
+def generateSource(source, fileName):
+    """ Generate the source of a module containing the coroutine versions of
+    all invertible generators in the given module source, or None if there
+    are none. """
+
+    if not hasattr(ast, 'unparse'):
+        raise Exception(
+            "Generating coroutine modules requires python 3.9 or later.")
+
+    tree = ast.parse(source)
+
+    finder = FindInvertibleGenerators()
+    finder.visit(tree)
+    if not finder.found:
+        return None
+
+    # the original code identifies each function, and tells which of its
+    # variables are closure cells
+    originalCodes = dict(
+        ((code.co_name, code.co_firstlineno), code)
+        for code in iterateCodes(compile(tree, fileName, 'exec')))
+
+    parts = [_header % {
+        'source': os.path.basename(fileName),
+        'hash': sourceHash(source),
+        'version': TRANSFORMER_VERSION,
+    }]
+
+    for funcNode in finder.found:
+        key = (funcNode.name, _firstLine(funcNode))
+        freeVariables = originalCodes[key].co_freevars
+
+        RemoveDecorators().visit(funcNode)
+        InvertGenerator().visit(funcNode)
+        _removeDefaultsAndAnnotations(funcNode)
+        ast.fix_missing_locations(funcNode)
+
+        if freeVariables:
+            parts.append(ast.unparse(wrapInClosure(funcNode, freeVariables)))
+            parts.append('codes[%r] = findFunctionCode(_closure.__code__, %r)'
+                         % (key, funcNode.name))
+        else:
+            parts.append(ast.unparse(funcNode))
+            parts.append('codes[%r] = %s.__code__' % (key, funcNode.name))
+
+    return '\n\n'.join(parts) + '\n'
+
+
+def _writeFile(path, contents):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as outputFile:
+        outputFile.write(contents)
+
+
+def compileModuleFile(sourceFile):
+    """ Write the generated module for a source file. Returns its path, or
+    None if the source contains no invertible generators. """
+
+    with open(sourceFile, 'rb') as source:
+        generatedSource = generateSource(source.read(), sourceFile)
+
+    outputPath = generatedPath(sourceFile)
+    packageInit = os.path.join(os.path.dirname(outputPath), '__init__.py')
+
+    if generatedSource is None:
+        if os.path.isfile(outputPath):
+            if outputPath == packageInit:
+                # must stay in place for the other generated modules of the
+                # package to be importable
+                _writeFile(outputPath, _packageHeader)
+            else:
+                os.remove(outputPath)
+        return None
+
+    _writeFile(outputPath, generatedSource)
+    if not os.path.isfile(packageInit):
+        _writeFile(packageInit, _packageHeader)
+
+    return outputPath
+
+
+def _packageSourceFiles(directory):
+    for root, directories, fileNames in os.walk(directory):
+        # only descend into subpackages, skipping generated ones
+        directories[:] = [
+            d for d in directories
+            if d != GENERATED_PACKAGE and
+            os.path.isfile(os.path.join(root, d, '__init__.py'))]
+
+        for fileName in sorted(fileNames):
+            if fileName.endswith('.py'):
+                yield os.path.join(root, fileName)
+
+
+def compilePackage(name):
+    """ Write generated modules for the given module, or for all modules in
+    the given package and its subpackages. Returns the paths written.
+
+    Generated modules are only looked up for modules inside a package, so
+    top-level modules are rejected. """
+
+    if find_spec is None:
+        raise Exception(
+            "Generating coroutine modules requires python 3.9 or later.")
+
+    spec = find_spec(name)
+    locations = getattr(spec, 'submodule_search_locations', None)
+
+    if locations:
+        sourceFiles = [
+            sourceFile
+            for location in locations
+            for sourceFile in _packageSourceFiles(location)]
+    elif '.' not in name:
+        raise Exception(
+            "Cannot generate coroutines for top-level module %s, only for "
+            "packages and the modules in them" % name)
+    else:
+        sourceFile = findSourceFile(name)
+        if sourceFile is None:
+            raise Exception("Cannot find the source of module %s" % name)
+        sourceFiles = [sourceFile]
+
+    written = []
+    for sourceFile in sourceFiles:
+        outputPath = compileModuleFile(sourceFile)
+        if outputPath is not None:
+            written.append(outputPath)
+
+    return written
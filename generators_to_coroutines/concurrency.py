@@ -0,0 +1,379 @@
+""" Decoupling the stages of a push pipeline across threads.
+
+Pushing a value into a coroutine pipeline runs all of its stages before send
+returns, so a slow stage stalls whoever pushes. A BufferedEdge is a target
+that only puts values in a bounded buffer; a worker thread takes them out and
+pushes them on to the downstream part of the pipeline:
+
+    pipeline = genMap.co(parse, BufferedEdge(genFilter.co(isValid, sink)))
+
+What send does when the buffer is full is up to the policy: BLOCK until the
+worker makes room, DROP the value, or SPILL it to a temporary file, from which
+the worker reads it back in order once it has caught up, at most maxSize
+values at a time.
+
+Coroutines raise "generator already executing" when several threads send to
+them at once. A ThreadSafeIngress is a BufferedEdge that any number of threads
+can send to, feeding a single pipeline run by its drain thread.
+
+A TimedBatcher gathers values into batches for sinks that are faster in bulk,
+and has a timer thread pass a batch on once its first value has waited long
+enough, even if no more values arrive. """
+
+import atexit
+import pickle
+import tempfile
+import threading
+import weakref
+from collections import deque, namedtuple
+
+from .instrumentation import timer
+from .tools import pushAll
+
+
+BLOCK = 'block'
+DROP = 'drop'
+SPILL = 'spill'
+
+
+class EdgeMetrics(namedtuple('EdgeMetrics', [
+        'depth', 'maxDepth', 'stalls', 'stallTime', 'dropped', 'spilled'])):
+    """ Metrics of a BufferedEdge: the number of values waiting for the
+    worker, the most there ever were, how many sends blocked on a full buffer
+    and for how long in total, in seconds, and the number of values dropped
+    and spilled to disk. """
+
+    __slots__ = ()
+
+
+class BufferedEdge(object):
+    """ A target putting the values sent to it in a buffer of at most maxSize
+    values, which a worker thread pushes on to the downstream target. Closing
+    waits for the worker to push the values left, then closes the downstream
+    target.
+
+    An exception raised by the downstream target stops the worker, and is
+    raised again by the next call to send or close. So is StopIteration,
+    once the downstream target has finished. """
+
+    def __init__(self, target, maxSize=1024, policy=BLOCK,
+                 spillDirectory=None):
+        if policy not in (BLOCK, DROP, SPILL):
+            raise ValueError("Unknown buffer policy %r" % (policy,))
+
+        self.target = target
+        self.maxSize = maxSize
+        self.policy = policy
+        self.spillDirectory = spillDirectory
+
+        # send holds the lock itself rather than through the condition,
+        # which is cheaper
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._buffer = deque()
+        self._spillFile = None
+        self._spilledWaiting = 0
+        # the spill file the worker reads back, and the values left in it
+        self._readFile = None
+        self._readLeft = 0
+        self._closed = False
+        self._error = None
+        self._pushing = False
+
+        self._maxDepth = 0
+        self._stalls = 0
+        self._stallTime = 0.0
+        self._dropped = 0
+        self._spilled = 0
+
+        self._worker = threading.Thread(target=self._work,
+                                        name=type(self).__name__)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def send(self, val):
+        with self._lock:
+            self._checkOpen()
+
+            if self._spilledWaiting or len(self._buffer) >= self.maxSize:
+                if self.policy == DROP:
+                    self._dropped += 1
+                    return
+                elif self.policy == SPILL:
+                    self._spill(val)
+                    return
+                else:
+                    self._wait()
+
+            self._buffer.append(val)
+            if len(self._buffer) > self._maxDepth:
+                self._updateMaxDepth()
+            if len(self._buffer) == 1:
+                # the worker only waits for an empty buffer
+                self._condition.notify()
+
+    def flush(self):
+        """ Wait until the values sent so far have been pushed downstream """
+
+        with self._condition:
+            while (self._buffer or self._spilledWaiting or self._pushing) \
+                    and self._error is None:
+                self._condition.wait()
+
+        self._raiseError()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        if self._worker is not threading.current_thread():
+            self._worker.join()
+
+        self._raiseError()
+
+    def metrics(self):
+        with self._condition:
+            return EdgeMetrics(
+                len(self._buffer) + self._spilledWaiting, self._maxDepth,
+                self._stalls, self._stallTime, self._dropped, self._spilled)
+
+    def _checkOpen(self):
+        """ Raise if values can no longer be sent, with the lock held """
+
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise ValueError("send to a closed %s" % type(self).__name__)
+
+    def _raiseError(self):
+        """ Raise the error that stopped the worker, unless the target just
+        finished """
+
+        error = self._error
+        if error is not None and not isinstance(error, StopIteration):
+            self._error = None
+            raise error
+
+    def _wait(self):
+        """ Block until there is room in the buffer, with the lock held """
+
+        self._stalls += 1
+        start = timer()
+        while len(self._buffer) >= self.maxSize and self._error is None \
+                and not self._closed:
+            self._condition.wait()
+        self._stallTime += timer() - start
+
+        self._checkOpen()
+
+    def _spill(self, val):
+        """ Append a value to the spill file, with the lock held """
+
+        if self._spillFile is None:
+            self._spillFile = tempfile.TemporaryFile(dir=self.spillDirectory)
+        pickle.dump(val, self._spillFile, pickle.HIGHEST_PROTOCOL)
+        self._spilledWaiting += 1
+        self._spilled += 1
+        self._updateMaxDepth()
+        self._condition.notify()
+
+    def _updateMaxDepth(self):
+        depth = len(self._buffer) + self._spilledWaiting
+        if depth > self._maxDepth:
+            self._maxDepth = depth
+
+    def _take(self):
+        """ Wait for values to push, and take them all from the buffer, or
+        else at most maxSize of them from the spill file. Values are only
+        spilled once the buffer is full, and for as long as spilled values are
+        waiting, so that taking the buffer first keeps them in order. Values
+        spilled while the worker reads a spill file back go to a new one.
+        Returns None once closed and no values are left. """
+
+        with self._condition:
+            while not self._buffer and not self._spilledWaiting and \
+                    not self._closed:
+                self._condition.wait()
+
+            if self._buffer:
+                values, self._buffer = self._buffer, deque()
+                count = 0
+            elif self._spilledWaiting:
+                if not self._readLeft:
+                    self._readFile, self._spillFile = self._spillFile, None
+                    self._readFile.seek(0)
+                    self._readLeft = self._spilledWaiting
+                count = min(self._readLeft, self.maxSize)
+                self._readLeft -= count
+                self._spilledWaiting -= count
+            else:
+                return None
+
+            self._pushing = True
+            # wake up senders blocked on a full buffer
+            self._condition.notify_all()
+
+        if count:
+            # only the worker uses the file being read back
+            readFile = self._readFile
+            values = [pickle.load(readFile) for _ in range(count)]
+            if not self._readLeft:
+                readFile.close()
+                self._readFile = None
+
+        return values
+
+    def _work(self):
+        try:
+            for values in iter(self._take, None):
+                if pushAll(values, self.target, close=False).pushed < \
+                        len(values):
+                    raise StopIteration
+
+                with self._condition:
+                    self._pushing = False
+                    # wake up flush
+                    self._condition.notify_all()
+
+            self.target.close()
+        except BaseException as error:
+            with self._condition:
+                self._error = error
+                self._condition.notify_all()
+
+
+# ingresses still open, flushed and closed when the program exits
+_openIngresses = weakref.WeakSet()
+
+
+@atexit.register
+def _closeIngresses():
+    for ingress in list(_openIngresses):
+        ingress.close()
+
+
+class ThreadSafeIngress(BufferedEdge):
+    """ A target that any number of threads can send values to at the same
+    time, feeding them to a single pipeline. The values from all threads are
+    gathered in a buffer of at most maxSize values, which the drain thread
+    swaps for an empty one and pushes on to the target, in the order they
+    were sent. Senders block while the buffer is full.
+
+    Closing pushes the values left and closes the target, and happens at the
+    latest when the program exits. """
+
+    def __init__(self, target, maxSize=65536):
+        super(ThreadSafeIngress, self).__init__(target, maxSize, BLOCK)
+        _openIngresses.add(self)
+
+    def sendMany(self, values):
+        """ Send several values in order, taking the lock once rather than
+        once per value, unless the buffer fills up. """
+
+        values = list(values)
+        with self._lock:
+            while values:
+                self._checkOpen()
+
+                room = self.maxSize - len(self._buffer)
+                if room <= 0:
+                    self._wait()
+                    continue
+
+                wasEmpty = not self._buffer
+                self._buffer.extend(values[:room])
+                del values[:room]
+                self._updateMaxDepth()
+                if wasEmpty:
+                    self._condition.notify()
+
+    def close(self):
+        _openIngresses.discard(self)
+        super(ThreadSafeIngress, self).close()
+
+
+class TimedBatcher(object):
+    """ A target gathering the values sent to it into lists of up to size
+    values, and sending them to the target once full, at the latest seconds
+    after their first value was sent (by a timer thread, if no more values
+    arrive), and when closed, before closing the target.
+
+    The target is sent batches from one thread at a time, either the sending
+    one or the timer thread. An exception it raises in the timer thread is
+    raised again by the next call to send or close. """
+
+    def __init__(self, target, size, seconds):
+        self.target = target
+        self.size = size
+        self.seconds = seconds
+
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._batch = []
+        self._deadline = None
+        self._closed = False
+        self._error = None
+
+        self._timer = threading.Thread(target=self._flushOnTime,
+                                       name=type(self).__name__)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def send(self, val):
+        with self._lock:
+            self._checkOpen()
+
+            batch = self._batch
+            batch.append(val)
+            if len(batch) >= self.size:
+                self._flush()
+            elif len(batch) == 1:
+                self._deadline = timer() + self.seconds
+                self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._timer.join()
+
+        with self._lock:
+            if self._error is not None:
+                raise self._error
+            if self._batch:
+                self._flush()
+        self.target.close()
+
+    def _checkOpen(self):
+        """ Raise if values can no longer be sent, with the lock held """
+
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise ValueError("send to a closed %s" % type(self).__name__)
+
+    def _flush(self):
+        """ Send the batch to the target, with the lock held """
+
+        batch, self._batch = self._batch, []
+        self._deadline = None
+        self.target.send(batch)
+
+    def _flushOnTime(self):
+        with self._condition:
+            while not self._closed:
+                if self._deadline is None:
+                    self._condition.wait()
+                    continue
+
+                remaining = self._deadline - timer()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+
+                try:
+                    self._flush()
+                except BaseException as error:
+                    self._error = error
+                    return
@@ -1,8 +1,30 @@
-from .ast_transformers import InvertGenerator, transformAstWith
 from .descriptor_magic import \
     wrapMethodAndAttachDescriptors, BindingExtensionDescriptor
+from .instrumentation import instrumentationEnabled
+import os
 import six
-import inspect
+import sys
+
+# The AST machinery (ast, inspect, ...) is only imported once a conversion is
+# actually performed, so that processes which only ever pull from generators
+# do not pay for it when lazy conversion is enabled.
+
+LAZY_ENVIRONMENT_VARIABLE = 'GENERATORS_TO_COROUTINES_LAZY'
+
+_lazyConversion = os.environ.get(LAZY_ENVIRONMENT_VARIABLE, '') not in ('', '0')
+
+
+def enableLazyConversion():
+    """ Defer conversion of subsequently decorated generators until their
+    coroutine is first used. """
+    global _lazyConversion
+    _lazyConversion = True
+
+
+def disableLazyConversion():
+    """ Convert subsequently decorated generators immediately. """
+    global _lazyConversion
+    _lazyConversion = False
 
 
 def coroutine(func):
@@ -13,15 +35,25 @@ def coroutine(func):
     return start
 
 
-def _funcIsMethod(stackFromFunc):
+def _frameIsClassBody(frame):
+    """ Determine whether a frame is executing the body of a class statement,
+    i.e. whether functions defined in it become methods. """
+    localEnv = frame.f_locals
+    return localEnv is not frame.f_globals and '__module__' in localEnv
+
+
+def _funcIsMethod(func, callerFrame):
     """ Determine whether a function being decorated is actually a method of a
-    class, given the stack frames above the decorator invocation. """
-    funcFrame = stackFromFunc[0]
-    potentialClassName = funcFrame[3]
+    class, given the frame invoking the decorator.
+
+    The qualified name of the function gives this away directly where it is
+    available (python 3.3+). Otherwise, the frame is inspected. """
+    qualname = getattr(func, '__qualname__', None)
+    if qualname is not None:
+        scope, _, _ = qualname.rpartition('.')
+        return scope != '' and not scope.endswith('<locals>')
 
-    nextFrame = stackFromFunc[1]
-    return nextFrame[3] == '<module>' and \
-        nextFrame[4][0].startswith('class ' + potentialClassName)
+    return _frameIsClassBody(callerFrame)
 
 
 def hasInvertibleMethods(cls):
@@ -49,34 +81,116 @@ def hasInvertibleMethods(cls):
     return cls
 
 
-def _makeInvertibleUsingFrame(frame, func):
-    """ Add a co method to a generator function, that is the equivalent
-    coroutine. """
+def _makeInvertible(func, transformerName='InvertGenerator'):
+    """ Create the coroutine equivalent to a generator function, using the
+    named transformer from the ast_transformers module. Coroutines generated
+    ahead of time are preferred (see the generated module), unless
+    instrumentation is enabled (see the instrumentation module). """
 
-    return coroutine(
-        transformAstWith(
-            frame[0].f_globals,
-            frame[0].f_locals,
-            [InvertGenerator])(func)
-    )
+    # push objects are not instrumented
+    instrument = instrumentationEnabled() and \
+        transformerName != 'InvertGeneratorToClass'
 
+    transformedFunc = None
+    if transformerName == 'InvertGenerator' and not instrument:
+        from .generated import generatedFunction
+        transformedFunc = generatedFunction(func)
 
-def invertibleGenerator(func):
-    """ Add a co method to a generator function, that is the equivalent
-    coroutine. """
+    if transformedFunc is None:
+        from . import ast_transformers
+
+        transformers = [getattr(ast_transformers, transformerName)]
+        if instrument:
+            transformers.append(ast_transformers.InstrumentStages.named(
+                getattr(func, '__qualname__', func.__name__)))
+
+        transformedFunc = ast_transformers.transformAstWith(
+            six.get_function_globals(func), None, transformers)(func)
+
+    if transformerName == 'InvertGeneratorToClass':
+        return _makeClass(transformedFunc, func)
 
-    frames = inspect.stack()
-    nextFrame = frames[1]
+    if transformerName == 'InvertGeneratorAsync':
+        from .aio import acoroutine
+        return acoroutine(transformedFunc)
 
-    transformedFunc = _makeInvertibleUsingFrame(nextFrame, func)
+    return coroutine(transformedFunc)
 
-    if _funcIsMethod(frames[1:]):
+
+def _makeClass(transformedFunc, func):
+    """ Create the push object class from a function transformed with
+    InvertGeneratorToClass, taking the defaults of the original function. """
+
+    cls = transformedFunc()
+    init = cls.__dict__['__init__']
+    init.__defaults__ = six.get_function_defaults(func)
+    if hasattr(func, '__kwdefaults__'):
+        init.__kwdefaults__ = func.__kwdefaults__
+
+    return cls
+
+
+class LazyCoroutine(object):
+    """ Stands in for the coroutine equivalent to a generator function. The
+    conversion is performed when it is first called, and then memoized. """
+
+    def __init__(self, func, transformerName='InvertGenerator'):
+        self.func = func
+        self.transformerName = transformerName
+        self.coroutine = None
+
+    def __call__(self, *args, **kwargs):
+        co = self.coroutine
+        if co is None:
+            co = self.coroutine = _makeInvertible(
+                self.func, self.transformerName)
+        return co(*args, **kwargs)
+
+
+def _attachCoroutines(func, coroutines, isMethod):
+    """ Attach the coroutines, given as a dictionary by name, as members of
+    the generator function, or of the bound methods if the function is a
+    method. """
+
+    if isMethod:
         # TODO: either remove, or use in class decorator
         func.markForConversion = True
 
-        return wrapMethodAndAttachDescriptors({
-            'co': BindingExtensionDescriptor(transformedFunc)
-        })(func)
+        return wrapMethodAndAttachDescriptors(dict(
+            (name, BindingExtensionDescriptor(co))
+            for name, co in six.iteritems(coroutines)))(func)
     else:
-        func.co = transformedFunc
+        for name, co in six.iteritems(coroutines):
+            setattr(func, name, co)
         return func
+
+
+def invertibleGenerator(func):
+    """ Add a co method to a generator function, that is the equivalent
+    coroutine, a co_batch method, that is the equivalent coroutine
+    pushing and being pushed lists of values at a time (see
+    InvertGeneratorBatched), and a co_object method, that creates an
+    equivalent push object with plain send and close methods (see
+    InvertGeneratorToClass). On python 3.6+, an aco method is also added,
+    that creates the equivalent asynchronous stage (see the aio module).
+
+    If lazy conversion is enabled (see enableLazyConversion, or set the
+    GENERATORS_TO_COROUTINES_LAZY environment variable), the conversion is
+    deferred until co is first called. co_batch, co_object and aco are always
+    converted lazily, as not all generators can be converted to them. """
+
+    if _lazyConversion:
+        transformedFunc = LazyCoroutine(func)
+    else:
+        transformedFunc = _makeInvertible(func)
+
+    coroutines = {
+        'co': transformedFunc,
+        'co_batch': LazyCoroutine(func, 'InvertGeneratorBatched'),
+        'co_object': LazyCoroutine(func, 'InvertGeneratorToClass'),
+    }
+    if sys.version_info >= (3, 6):
+        coroutines['aco'] = LazyCoroutine(func, 'InvertGeneratorAsync')
+
+    return _attachCoroutines(
+        func, coroutines, _funcIsMethod(func, sys._getframe(1)))
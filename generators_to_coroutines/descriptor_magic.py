@@ -1,4 +1,3 @@
-import copy
 import six
 
 
@@ -29,6 +28,8 @@ def wrapMethodAndAttachDescriptors(descriptors):
     """ Given a dictionary mapping names to descriptor objects, create a
     decorator for attaching these descriptors to a bound method. """
 
+    wrapperClass = _boundMethodWrapperClass(descriptors)
+
     class WrapMethod(object):
         """ A descriptor that wraps a method, and intercepts calls to __get__,
         to inject other descriptors onto instances of the bound method. """
@@ -40,8 +41,7 @@ def wrapMethodAndAttachDescriptors(descriptors):
         def __get__(self, obj, type=None):
             method = six.create_bound_method(self.func, obj)
             if obj is not None:
-                return _wrapAlreadyBoundMethodAndAttachDescriptors(
-                    method, self.descriptors)
+                return wrapperClass(method)
             return method
 
     return WrapMethod
@@ -51,25 +51,26 @@ class BoundMethodWrapper(object):
     """ Wraps a bound method in an object, to allow invoking of descriptors on
     said method. """
 
+    __slots__ = ('boundMethod', '__self__', '__func__')
+
     def __init__(self, boundMethod):
         self.boundMethod = boundMethod
+        self.__self__ = boundMethod.__self__
+        self.__func__ = boundMethod.__func__
 
     def __call__(self, *args, **kwargs):
         return self.boundMethod(*args, **kwargs)
 
     def __getattr__(self, attr):
-        return self.boundMethod.__getattribute__(attr)
-
+        return getattr(self.boundMethod, attr)
 
-def _wrapAlreadyBoundMethodAndAttachDescriptors(boundMethod, descriptors):
-    """ Given a bound method and descriptors, wrap the method appropriately so
-    the descriptors are properly attached and invoked. """
 
-    # need a specialized copy of the wrapping class to attach these
-    # descriptors
-    localBoundMethodWrapperClass = copy.copy(BoundMethodWrapper)
+def _boundMethodWrapperClass(descriptors):
+    """ Given descriptors, create a subclass of BoundMethodWrapper to which
+    they are attached, so they are invoked on the wrapped methods. The class
+    is created once per method, rather than once per bound method. """
 
-    for key in descriptors:
-        setattr(localBoundMethodWrapperClass, key, descriptors[key])
+    attributes = dict(descriptors)
+    attributes['__slots__'] = ()
 
-    return localBoundMethodWrapperClass(boundMethod)
+    return type('BoundMethodWrapper', (BoundMethodWrapper,), attributes)
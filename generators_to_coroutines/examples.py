@@ -1,22 +1,7 @@
 #!/usr/bin/env python
 
-from .decorators import coroutine
 from .tools import genPassthrough, genFilter, genMap, genPairs,\
-    coReceive, pushFromIterable
-
-
-@coroutine
-def coSplit(predicate, trueTarget, falseTarget):
-
-    while True:
-        val = (yield)
-        if predicate(val):
-            trueTarget.send(val)
-        else:
-            falseTarget.send(val)
-
-    trueTarget.close()
-    falseTarget.close()
+    coReceive, coSplit, pushFromIterable
 
 
 if __name__ == "__main__":
@@ -51,3 +36,7 @@ if __name__ == "__main__":
         coReceive()
         ))))
     pushFromIterable(words, coroutinePipeline)
+
+    print("Split coroutines:")
+    pushFromIterable(words, coSplit(
+        predicate, genMap.co(str.upper, coReceive()), coReceive()))
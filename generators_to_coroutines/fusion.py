@@ -0,0 +1,261 @@
+""" Fusion of a linear chain of generators into a single coroutine.
+
+A pipeline of coroutines resumes a generator frame at every stage for every
+value. fusePipeline instead inlines the loop bodies of all stages into one
+coroutine: where a stage yields a value, the body of the next stage's loop runs
+directly on that value. The state of each stage becomes local variables of the
+fused coroutine, which only switches frames once per value pushed into it.
+
+Only generators of a simple shape can be fused: a single loop over the
+iterable, as a statement directly in the function body, with no yield before
+it, no break, continue or return exiting it, and yield only used as a
+statement. Statements after the loop run when the fused coroutine is closed,
+in the order of the stages. Globals referred to by the stages are looked up
+once, when fusing. """
+
+import ast
+import copy
+import inspect
+import textwrap
+
+import six
+from six.moves import builtins
+
+from .ast_transformers import AnalyzeGeneratorFunction, findSingleLoop
+from .decorators import coroutine
+
+
+def _argumentNames(func):
+    if six.PY3:
+        return inspect.getfullargspec(func).args
+    return inspect.getargspec(func).args
+
+
+class _RenameNames(ast.NodeTransformer):
+    """ Rename variables according to a dictionary. """
+
+    def __init__(self, names):
+        self.names = names
+
+    def visit_Name(self, node):
+        if node.id in self.names:
+            return ast.copy_location(
+                ast.Name(id=self.names[node.id], ctx=node.ctx), node)
+        return node
+
+
+class _InlineYields(ast.NodeTransformer):
+    """ Replace "yield value" statements with statements that process value
+    in the downstream stages. """
+
+    def __init__(self, inlineValue):
+        self.inlineValue = inlineValue
+
+    def visit_Expr(self, node):
+        if isinstance(node.value, ast.Yield):
+            return self.inlineValue(node.value.value)
+        return node
+
+
+class _Stage(object):
+    """ A generator stage, parsed and checked for fusion, with its variables
+    renamed to be unique to the stage. """
+
+    def __init__(self, index, stage):
+        if isinstance(stage, tuple):
+            func, args = stage[0], stage[1:]
+        else:
+            func, args = stage, ()
+
+        # methods are fused with their instance as the first argument
+        if hasattr(func, '__self__') and hasattr(func, '__func__'):
+            func, args = func.__func__, (func.__self__,) + tuple(args)
+
+        self.func = func
+        self.localPrefix = '_s%d_' % index
+        self.globalPrefix = '_g%d_' % index
+
+        funcNode = ast.parse(
+            textwrap.dedent(inspect.getsource(func))).body[0]
+
+        analysis = AnalyzeGeneratorFunction()
+        analysis.visit(funcNode)
+        self._check(funcNode, analysis)
+
+        iterableId = analysis.target.id
+        loopIndex = funcNode.body.index(
+            next(iter(analysis.loopsToBeConverted)))
+
+        # the values of all parameters apart from the iterable become
+        # parameters of the fused coroutine
+        callArgs = list(args)
+        callArgs.insert(_argumentNames(func).index(iterableId), None)
+        values = inspect.getcallargs(func, *callArgs)
+        del values[iterableId]
+        self.parameters = dict(
+            (self.localPrefix + name, value)
+            for name, value in six.iteritems(values))
+
+        self.globals = {}
+        funcNode = _RenameNames(
+            self._names(funcNode, analysis, values)).visit(funcNode)
+
+        loop = funcNode.body[loopIndex]
+        self.prelude = funcNode.body[:loopIndex]
+        self.loopTarget = loop.target
+        self.body = loop.body
+        self.postlude = funcNode.body[loopIndex + 1:]
+
+    def _check(self, funcNode, analysis):
+        loop = findSingleLoop(funcNode, analysis, "fused")
+
+        for node in ast.walk(funcNode):
+            if isinstance(node, ast.Return):
+                raise Exception(
+                    "%s cannot be fused: it uses Return." % funcNode.name)
+
+            if isinstance(node, ast.Name) and \
+                    node.id == analysis.target.id and node is not loop.iter:
+                raise Exception(
+                    "%s cannot be fused: it uses its iterable other than by "
+                    "looping over it." % funcNode.name)
+
+    def _names(self, funcNode, analysis, values):
+        """ Map the names used by the stage to names unique to it. Local
+        variables are prefixed, and global ones are prefixed and bound to
+        their current values. Builtins are left alone. """
+
+        localIds = set(values) | analysis.functionArgumentIds
+        for node in ast.walk(funcNode):
+            if isinstance(node, ast.Name) and \
+                    not isinstance(node.ctx, ast.Load):
+                localIds.add(node.id)
+
+        closure = dict(zip(
+            six.get_function_code(self.func).co_freevars,
+            [cell.cell_contents
+             for cell in six.get_function_closure(self.func) or ()]))
+        globalEnv = six.get_function_globals(self.func)
+
+        names = dict((name, self.localPrefix + name) for name in localIds)
+        for name in analysis.loadedNames - localIds:
+            if name in closure:
+                value = closure[name]
+            elif name in globalEnv:
+                value = globalEnv[name]
+            else:
+                continue
+            names[name] = self.globalPrefix + name
+            self.globals[names[name]] = value
+
+        return names
+
+
+def _sendStatement(value):
+    return ast.Expr(value=ast.Call(
+        func=ast.Attribute(
+            value=ast.Name(id='target', ctx=ast.Load()),
+            attr='send',
+            ctx=ast.Load()),
+        args=[value],
+        keywords=[],
+        starargs=None,
+        kwargs=None))
+
+
+def _clearLocations(nodes):
+    """ Statements are gathered from several sources, so their locations are
+    meaningless in the fused coroutine. """
+    for stmt in nodes:
+        for node in ast.walk(stmt):
+            for attr in node._attributes:
+                if attr in vars(node):
+                    delattr(node, attr)
+
+
+def fusePipeline(*stages):
+    """ Fuse a chain of generator stages, from upstream to downstream, into a
+    single coroutine. Returns a function that creates the coroutine given its
+    target.
+
+    Each stage is a generator function or method, or a tuple of one followed
+    by its arguments other than the iterable. For example
+
+        fusePipeline(genPassthrough, (genFilter, predicate),
+                     (genMap, str.upper), genPairs)(target)
+
+    is equivalent to
+
+        genPassthrough.co(genFilter.co(predicate,
+            genMap.co(str.upper, genPairs.co(target))))
+    """
+
+    parsed = [_Stage(index, stage) for index, stage in enumerate(stages)]
+
+    def inline(statements, index):
+        """ Inline the stages after the given one, where it yields. """
+
+        def inlineValue(value):
+            if index + 1 == len(parsed):
+                return _sendStatement(value)
+
+            downstream = parsed[index + 1]
+            return [ast.Assign(targets=[copy.deepcopy(downstream.loopTarget)],
+                               value=value)] + \
+                inline(copy.deepcopy(downstream.body), index + 1)
+
+        transformer = _InlineYields(inlineValue)
+        inlined = []
+        for stmt in statements:
+            newStatements = transformer.visit(stmt)
+            if isinstance(newStatements, list):
+                inlined.extend(newStatements)
+            else:
+                inlined.append(newStatements)
+        return inlined
+
+    receiveStatement = ast.Assign(
+        targets=[copy.deepcopy(parsed[0].loopTarget)],
+        value=ast.Yield(value=None))
+
+    body = []
+    for index, stage in enumerate(parsed):
+        body.extend(stage.prelude)
+
+    loopTemplate = ast.parse(textwrap.dedent('''
+        try:
+            while True:
+                pass
+        except GeneratorExit:
+            pass
+        ''')).body[0]
+    loopTemplate.body[0].body = \
+        [receiveStatement] + inline(parsed[0].body, 0)
+    body.append(loopTemplate)
+
+    for index, stage in enumerate(parsed):
+        body.extend(inline(stage.postlude, index))
+
+    parameters = {}
+    globalEnv = {'__builtins__': builtins}
+    for stage in parsed:
+        parameters.update(stage.parameters)
+        globalEnv.update(stage.globals)
+
+    parameterNames = sorted(parameters)
+    module = ast.parse('def fused(%s):\n    pass\n' %
+                       ', '.join(['target'] + parameterNames))
+    _clearLocations(body)
+    module.body[0].body = body
+    ast.fix_missing_locations(module)
+
+    namespace = {}
+    six.exec_(compile(module, '<fused pipeline>', 'exec'), globalEnv,
+              namespace)
+    fused = coroutine(namespace['fused'])
+    arguments = [parameters[name] for name in parameterNames]
+
+    def createFused(target):
+        return fused(target, *arguments)
+
+    return createFused
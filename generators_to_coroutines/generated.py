@@ -0,0 +1,96 @@
+""" Lookup of coroutines generated ahead of time.
+
+"python -m generators_to_coroutines compile <package>" writes the coroutine
+versions of all invertible generators in a module "package/module.py" to a
+plain python module "package/_coroutines/module.py" (and those of a package's
+own __init__.py to "package/_coroutines/__init__.py"). When such a module
+exists and is up to date, invertibleGenerator uses the code in it instead of
+converting the generator at runtime. """
+
+import hashlib
+import os
+import sys
+import warnings
+
+import six
+
+from .transformed import TRANSFORMER_VERSION, bindFunction
+
+
+GENERATED_PACKAGE = '_coroutines'
+
+
+def generatedPath(sourceFile):
+    """ Return the path of the generated module for a source file. """
+    directory, fileName = os.path.split(sourceFile)
+    return os.path.join(directory, GENERATED_PACKAGE, fileName)
+
+
+def sourceHash(source):
+    return hashlib.sha1(source).hexdigest()
+
+
+def _generatedModuleName(module):
+    if hasattr(module, '__path__'):
+        return '%s.%s' % (module.__name__, GENERATED_PACKAGE)
+
+    package, _, name = module.__name__.rpartition('.')
+    if not package:
+        return None
+    return '%s.%s.%s' % (package, GENERATED_PACKAGE, name)
+
+
+def _loadCodes(moduleName):
+    """ Load the generated code objects for a module, if they exist and are
+    up to date. """
+
+    module = sys.modules.get(moduleName)
+    sourceFile = getattr(module, '__file__', None)
+    generatedName = _generatedModuleName(module) if module else None
+    if not sourceFile or generatedName is None:
+        return None
+
+    if sourceFile.endswith(('.pyc', '.pyo')):
+        sourceFile = sourceFile[:-1]
+    if not os.path.isfile(generatedPath(sourceFile)):
+        return None
+
+    __import__(generatedName)
+    generated = sys.modules[generatedName]
+
+    with open(sourceFile, 'rb') as source:
+        upToDate = generated.SOURCE_HASH == sourceHash(source.read())
+
+    if not upToDate or generated.TRANSFORMER_VERSION != TRANSFORMER_VERSION:
+        warnings.warn(
+            "Ignoring out of date generated coroutines in %s. Regenerate them "
+            "with 'python -m generators_to_coroutines compile'." %
+            generatedName)
+        return None
+
+    return generated.codes
+
+
+# generated code objects per module name, or None if there are none
+_generatedCodes = {}
+
+
+def generatedFunction(func):
+    """ Return the transformed version of a function generated ahead of time,
+    or None if there is none. """
+
+    moduleName = func.__module__
+    try:
+        codes = _generatedCodes[moduleName]
+    except KeyError:
+        codes = _generatedCodes[moduleName] = _loadCodes(moduleName)
+
+    if codes is None:
+        return None
+
+    originalCode = six.get_function_code(func)
+    code = codes.get((originalCode.co_name, originalCode.co_firstlineno))
+    if code is None:
+        return None
+
+    return bindFunction(code, func, six.get_function_globals(func))
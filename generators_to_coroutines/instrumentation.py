@@ -0,0 +1,119 @@
+""" Statistics of instrumented coroutine pipeline stages.
+
+Instrumentation is opt-in: when it is enabled, with enableInstrumentation()
+or by setting the GENERATORS_TO_COROUTINES_INSTRUMENT environment variable,
+subsequently converted coroutines are compiled with the InstrumentStages
+transformer, and record their statistics here. Coroutines converted while it
+is disabled are compiled without it, and pay nothing.
+
+Statistics are kept per stage, i.e. per generator function, identified by its
+module and qualified name (its name on python 2), and shared by all
+coroutines created from it:
+
+    enableInstrumentation()
+    ... build and run pipelines ...
+    reportStageStats()
+"""
+
+import os
+import sys
+import time
+from collections import OrderedDict
+
+
+INSTRUMENT_ENVIRONMENT_VARIABLE = 'GENERATORS_TO_COROUTINES_INSTRUMENT'
+
+_instrumentation = \
+    os.environ.get(INSTRUMENT_ENVIRONMENT_VARIABLE, '') not in ('', '0')
+
+
+def enableInstrumentation():
+    """ Instrument subsequently converted coroutines. """
+    global _instrumentation
+    _instrumentation = True
+
+
+def disableInstrumentation():
+    """ Convert subsequently converted coroutines without instrumentation. """
+    global _instrumentation
+    _instrumentation = False
+
+
+def instrumentationEnabled():
+    return _instrumentation
+
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class StageStats(object):
+    """ Statistics of a stage: the number of coroutines created, of values
+    received and sent on, the time spent handling received values, and the
+    part of that time spent sending values on to the target, all in
+    seconds. """
+
+    __slots__ = ('name', 'instances', 'elementsIn', 'elementsOut',
+                 'totalTime', 'downstreamTime')
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.instances = 0
+        self.elementsIn = 0
+        self.elementsOut = 0
+        self.totalTime = 0.0
+        self.downstreamTime = 0.0
+
+    @property
+    def ownTime(self):
+        """ Time spent in the stage itself, excluding its target. """
+        return self.totalTime - self.downstreamTime
+
+    def __repr__(self):
+        return '<StageStats %s: %d in, %d out, %.6fs own, %.6fs total>' % (
+            self.name, self.elementsIn, self.elementsOut, self.ownTime,
+            self.totalTime)
+
+
+_stages = OrderedDict()
+
+
+def stageStats(moduleName, funcName):
+    """ Return the statistics of a stage, counting a new instance of it.
+    Called by instrumented coroutines when they are created. """
+
+    name = '%s.%s' % (moduleName, funcName)
+    stats = _stages.get(name)
+    if stats is None:
+        stats = _stages[name] = StageStats(name)
+
+    stats.instances += 1
+    return stats
+
+
+def allStageStats():
+    """ Return the statistics of all instrumented stages, in the order they
+    were first created. """
+    return list(_stages.values())
+
+
+def resetStageStats():
+    """ Reset the statistics of all stages to zero. Running coroutines keep
+    recording to them. """
+    for stats in _stages.values():
+        stats.reset()
+
+
+def reportStageStats(stream=None):
+    """ Print a table of the statistics of all stages, hottest first. """
+
+    stream = stream if stream is not None else sys.stdout
+    stream.write('%-40s %9s %10s %10s %12s %12s\n' % (
+        'stage', 'instances', 'in', 'out', 'own (s)', 'total (s)'))
+
+    for stats in sorted(_stages.values(), key=lambda s: -s.ownTime):
+        stream.write('%-40s %9d %10d %10d %12.6f %12.6f\n' % (
+            stats.name, stats.instances, stats.elementsIn,
+            stats.elementsOut, stats.ownTime, stats.totalTime))
@@ -0,0 +1,118 @@
+""" A source pushing the records of a memory-mapped file, without copying.
+
+pushMappedFile finds the boundaries of records (by default, lines) in a memory
+map of the file, and pushes memoryview slices of the map, or their (start,
+stop) offsets, to a pipeline. Nothing is decoded or copied unless a stage asks
+for it, e.g. tools.genDecode after a filter on the raw bytes:
+
+    pushMappedFile('big.log', genFilter.co(isError,
+        genDecode.co(genMap.co(parse, target))))
+
+The file is processed in chunks of chunkSize bytes. Where the platform
+supports it, the pages of each chunk are dropped from the process once its
+records have been pushed, so that resident memory stays flat however large
+the file is. Records still referenced by a stage remain valid: their pages
+are read back from the file when accessed. """
+
+import mmap
+import os
+import re
+from itertools import chain, repeat
+from operator import add
+
+from six.moves import map, zip
+
+from .tools import pushAll
+
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+_matchStart = type(re.match('', '')).start
+
+
+def _dropPages(mapped, start, stop):
+    """ Drop the pages of mapped[start:stop] from the process, if supported.
+    start must be a multiple of the page size. Returns where to start next
+    time. """
+
+    stop -= stop % mmap.PAGESIZE
+    if stop > start:
+        mapped.madvise(mmap.MADV_DONTNEED, start, stop - start)
+        return stop
+    return start
+
+
+def _chunkBoundaries(mapped, separator, chunkSize):
+    """ Yield the (starts, stops) of the records ending in each chunk of the
+    map, found by the regular expression engine rather than in python. """
+
+    pattern = re.compile(re.escape(separator))
+    size = len(mapped)
+    start = 0
+
+    while start < size:
+        chunkEnd = min(start + chunkSize, size)
+        stops = list(map(_matchStart,
+                         pattern.finditer(mapped, start, chunkEnd)))
+
+        if not stops:
+            # a record longer than a chunk
+            stop = mapped.find(separator, start)
+            stops = [size if stop < 0 else stop]
+        elif chunkEnd == size and stops[-1] + len(separator) < size:
+            # a last record without a separator
+            stops.append(size)
+
+        starts = [start]
+        starts.extend(map(add, stops[:-1], repeat(len(separator))))
+        yield starts, stops
+
+        start = stops[-1] + len(separator)
+
+
+def _records(mapped, separator, chunkSize, offsets):
+    view = memoryview(mapped)
+    canDropPages = hasattr(mapped, 'madvise') and \
+        hasattr(mmap, 'MADV_DONTNEED')
+    dropped = 0
+
+    try:
+        for starts, stops in _chunkBoundaries(mapped, separator, chunkSize):
+            # the records of the previous chunk have all been pushed by now
+            if canDropPages:
+                dropped = _dropPages(mapped, dropped, starts[0])
+
+            if offsets:
+                yield zip(starts, stops)
+            else:
+                yield map(view.__getitem__, map(slice, starts, stops))
+    finally:
+        view.release()
+
+
+def pushMappedFile(path, target, separator=b'\n', chunkSize=DEFAULT_CHUNK_SIZE,
+                   offsets=False):
+    """ Push the records of a file, separated by separator (not included in
+    the records), to a target as memoryview slices of a memory map of the
+    file, or as (start, stop) offsets into it, and close the target. Returns
+    PushStats. """
+
+    if not separator:
+        raise ValueError("The record separator must not be empty.")
+
+    with open(path, 'rb') as mappedFile:
+        if os.fstat(mappedFile.fileno()).st_size == 0:
+            return pushAll((), target)
+
+        mapped = mmap.mmap(mappedFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        return pushAll(chain.from_iterable(
+            _records(mapped, separator, chunkSize, offsets)), target)
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            # stages still hold records, which keep the map open until they
+            # are released
+            pass
@@ -0,0 +1,135 @@
+""" Conversion of all invertible generators in a module in a single pass.
+
+Decorating generators one at a time retrieves, parses and compiles the source
+of each one separately. invertModule instead parses the source of a whole
+module once, inverts every generator decorated with invertibleGenerator
+(including methods and generators nested in other functions) and compiles them
+all together. The results are registered with transformAstWith, so that the
+decorators pick them up instead of converting the generators themselves. """
+
+import ast
+import inspect
+import os
+import pkgutil
+import sys
+
+import six
+
+from .ast_transformers import \
+    InvertGenerator, RemoveDecorators, registerTransformedCode
+from .transformed import iterateCodes
+
+try:
+    from importlib.util import find_spec
+except ImportError:
+    find_spec = None
+
+
+# The transformers applied by invertibleGenerator
+_transformers = (RemoveDecorators, InvertGenerator)
+
+
+def _isInvertibleDecorator(node):
+    if isinstance(node, ast.Name):
+        return node.id == 'invertibleGenerator'
+    if isinstance(node, ast.Attribute):
+        return node.attr == 'invertibleGenerator'
+    return False
+
+
+class FindInvertibleGenerators(ast.NodeVisitor):
+    """ Collect all function definitions decorated with invertibleGenerator,
+    except ones nested inside another such definition. """
+
+    def __init__(self):
+        self.found = []
+
+    def visit_FunctionDef(self, node):
+        if any(_isInvertibleDecorator(d) for d in node.decorator_list):
+            self.found.append(node)
+        else:
+            self.generic_visit(node)
+
+
+def invertSource(source, fileName):
+    """ Invert all generators decorated with invertibleGenerator in the given
+    module source, and register the resulting code. Returns the number of
+    generators inverted. """
+
+    tree = ast.parse(source)
+
+    finder = FindInvertibleGenerators()
+    finder.visit(tree)
+
+    # decorators are left in place, as they determine the first line number
+    # of the compiled functions, which identifies them
+    wanted = set()
+    for funcNode in finder.found:
+        InvertGenerator().visit(funcNode)
+        for lineno in [funcNode.lineno] + \
+                [d.lineno for d in funcNode.decorator_list]:
+            wanted.add((funcNode.name, lineno))
+
+    ast.fix_missing_locations(tree)
+    moduleCode = compile(tree, fileName, 'exec')
+
+    for code in iterateCodes(moduleCode):
+        if (code.co_name, code.co_firstlineno) in wanted:
+            registerTransformedCode(code, _transformers)
+
+    return len(finder.found)
+
+
+def invertSourceFile(fileName):
+    """ Invert all generators decorated with invertibleGenerator in a source
+    file. See invertSource. """
+
+    with open(fileName, 'rb') as sourceFile:
+        return invertSource(sourceFile.read(), fileName)
+
+
+def findSourceFile(moduleName):
+    if find_spec is not None:
+        spec = find_spec(moduleName)
+        fileName = spec.origin if spec is not None else None
+    else:
+        loader = pkgutil.get_loader(moduleName)
+        fileName = loader.get_filename() if loader is not None else None
+
+    if fileName is not None and fileName.endswith('.py') and \
+            os.path.isfile(fileName):
+        return fileName
+
+    return None
+
+
+def invertModule(module):
+    """ Invert all generators decorated with invertibleGenerator in a module,
+    parsing and compiling its source only once.
+
+    module is either a module, or the name of one. A module that has not been
+    imported yet is imported after its generators are inverted, so that its
+    decorators pick up the inverted code. For a module that has already been
+    imported, this only benefits generators that have not been converted yet:
+    ones whose conversion is lazy (see enableLazyConversion), and ones nested
+    in functions that have not been called yet.
+
+    Returns the module. """
+
+    if isinstance(module, six.string_types):
+        moduleName = module
+        module = sys.modules.get(moduleName)
+
+        if module is None:
+            fileName = findSourceFile(moduleName)
+            if fileName is not None:
+                invertSourceFile(fileName)
+
+            __import__(moduleName)
+            return sys.modules[moduleName]
+
+    fileName = inspect.getsourcefile(module)
+    if fileName is not None:
+        invertSourceFile(fileName)
+
+    return module
@@ -0,0 +1,100 @@
+""" Vectorized stages for numeric streams, using NumPy (an optional
+dependency, only needed by this module).
+
+Rather than one python object at a time, these stages are passed NumPy arrays
+holding chunks of a stream of values, and apply vectorized operations to
+whole chunks. genArrayChunks and genArrayElements convert between streams of
+values and streams of chunks at the boundaries of a pipeline, and
+pushArray pushes an existing array in chunks, without copying:
+
+    pipeline = genChunkFilter.co(isPositive, genChunkMap.co(numpy.sqrt,
+        genChunkPairs.co(target)))
+    pushArray(samples, pipeline)
+
+Like the stages in tools, all of these are invertible generators. """
+
+import numpy
+
+from .decorators import invertibleGenerator
+from .tools import pushAll
+
+
+DEFAULT_CHUNK_SIZE = 4096
+
+
+@invertibleGenerator
+def genArrayChunks(iterable, chunkSize=DEFAULT_CHUNK_SIZE, dtype=float):
+    """ Gather values into arrays of chunkSize values, the last one possibly
+    shorter """
+
+    buf = []
+
+    for val in iterable:
+        buf.append(val)
+
+        if len(buf) >= chunkSize:
+            yield numpy.array(buf, dtype=dtype)
+            buf = []
+
+    if buf:
+        yield numpy.array(buf, dtype=dtype)
+
+
+@invertibleGenerator
+def genArrayElements(chunks):
+    """ Pass on the values of arrays one at a time, as python objects (rows
+    of multidimensional arrays become lists) """
+
+    for chunk in chunks:
+        for val in chunk.tolist():
+            yield val
+
+
+@invertibleGenerator
+def genChunkMap(func, chunks):
+    """ Map a vectorized function, e.g. a ufunc, on all chunks """
+
+    for chunk in chunks:
+        yield func(chunk)
+
+
+@invertibleGenerator
+def genChunkFilter(predicate, chunks):
+    """ Filter the values of all chunks with the boolean mask computed by a
+    vectorized predicate, dropping chunks left empty """
+
+    for chunk in chunks:
+        selected = chunk[predicate(chunk)]
+        if len(selected):
+            yield selected
+
+
+@invertibleGenerator
+def genChunkPairs(chunks):
+    """ Aggregate consecutive values into pairs, i.e. reshape chunks to rows
+    of two values, carrying a value left over to the next chunk """
+
+    leftover = None
+
+    for chunk in chunks:
+        if leftover is not None:
+            chunk = numpy.concatenate((leftover, chunk))
+            leftover = None
+
+        paired = len(chunk) - len(chunk) % 2
+        if paired < len(chunk):
+            leftover = chunk[paired:]
+
+        if paired:
+            yield chunk[:paired].reshape(-1, 2)
+
+
+def pushArray(array, target, chunkSize=DEFAULT_CHUNK_SIZE):
+    """ Push an array in chunks of chunkSize values, as views of the array
+    rather than copies, and close the target. Returns PushStats, counting
+    chunks. """
+
+    return pushAll(
+        (array[start:start + chunkSize]
+         for start in range(0, len(array), chunkSize)),
+        target)
@@ -0,0 +1,229 @@
+""" Execution of a coroutine pipeline sharded across worker processes, for
+CPU bound stages that threads cannot speed up.
+
+coShard is a coroutine that collects the values pushed to it into batches,
+and hands each batch to one of a number of worker processes. Each worker runs
+its own copy of a pipeline, created by a picklable factory (e.g. a module
+level function) given the target to push to:
+
+    def pipeline(target):
+        return genMap.co(parse, genFilter.co(isValid, target))
+
+    shards = coShard(pipeline, target, workers=4)
+
+The values the copies push are sent back in batches, and pushed on to the
+target. Stages keep their state per worker: e.g. genPairs would only pair
+values handled by the same worker. """
+
+import sys
+import traceback
+
+from six.moves import queue
+
+from .decorators import coroutine
+from .tools import pushAll
+
+
+class _Collector(object):
+    """ Target of the pipeline in a worker, collecting the values it pushes
+    until they are taken to be sent back. """
+
+    def __init__(self):
+        self.values = []
+
+    def send(self, val):
+        self.values.append(val)
+
+    def close(self):
+        pass
+
+    def take(self):
+        values, self.values = self.values, []
+        return values
+
+
+_BATCH = 'batch'
+_DONE = 'done'
+_FAILED = 'failed'
+
+# how often a blocked receive checks that the workers are still running
+_POLL_SECONDS = 0.1
+
+
+def _work(factory, inputs, outputs, workerIndex):
+    """ Run in a worker process: push batches from the inputs queue through
+    a copy of the pipeline, until None is received, and put the results on
+    the outputs queue. """
+
+    try:
+        collector = _Collector()
+        pipeline = factory(collector)
+
+        for batchIndex, batch in iter(inputs.get, None):
+            pushAll(batch, pipeline, close=False)
+            outputs.put((_BATCH, batchIndex, collector.take()))
+
+        pipeline.close()
+        outputs.put((_DONE, workerIndex, collector.take()))
+    except Exception:
+        outputs.put((_FAILED, workerIndex,
+                     ''.join(traceback.format_exception(*sys.exc_info()))))
+
+
+class _Results(object):
+    """ Receives results from the workers, and pushes them on to the target,
+    in the order of the batches if ordered. """
+
+    def __init__(self, processes, outputs, target, ordered):
+        self.processes = processes
+        self.outputs = outputs
+        self.target = target
+        self.ordered = ordered
+        self.inFlight = 0
+        self.nextBatchIndex = 0
+        self.pendingBatches = {}
+        self.finalValues = {}
+
+    def _exitedWorker(self):
+        """ Return the index of a worker that exited without finishing, or
+        None if there is none. """
+
+        for index, process in enumerate(self.processes):
+            if index not in self.finalValues and not process.is_alive():
+                return index
+        return None
+
+    def receive(self, block=True):
+        """ Receive one message from the workers, returning False if there is
+        none and block is False. Raises if a worker exits without finishing,
+        e.g. when killed, while waiting. """
+
+        exited = None
+        while True:
+            try:
+                kind, index, values = self.outputs.get(block, _POLL_SECONDS)
+                break
+            except queue.Empty:
+                if not block:
+                    return False
+                if exited is not None:
+                    raise Exception(
+                        "Shard worker %d exited with code %s" %
+                        (exited, self.processes[exited].exitcode))
+
+                # the last messages of an exited worker may still be on their
+                # way, so look once more before giving up on it
+                exited = self._exitedWorker()
+
+        if kind == _FAILED:
+            raise Exception("Shard worker %d failed:\n%s" % (index, values))
+
+        if kind == _DONE:
+            self.finalValues[index] = values
+            return True
+
+        self.inFlight -= 1
+        if not self.ordered:
+            pushAll(values, self.target, close=False)
+            return True
+
+        self.pendingBatches[index] = values
+        while self.nextBatchIndex in self.pendingBatches:
+            pushAll(self.pendingBatches.pop(self.nextBatchIndex),
+                    self.target, close=False)
+            self.nextBatchIndex += 1
+
+        return True
+
+    def finish(self, workers):
+        """ Receive all remaining results, once all workers were told to
+        stop, pushing the values of pipelines being closed last. """
+
+        while len(self.finalValues) < workers:
+            self.receive()
+
+        for workerIndex in sorted(self.finalValues):
+            pushAll(self.finalValues[workerIndex], self.target, close=False)
+
+
+@coroutine
+def coShard(factory, target, workers=None, batchSize=256, key=None,
+            ordered=False, maxInFlight=None):
+    """ Push values through copies of the pipeline created by factory, in
+    worker processes (by default, one per CPU), and push their results to the
+    target. Closing closes the pipelines, then the target.
+
+    Values are sent to the workers in batches of batchSize, to keep the cost
+    of pickling per value low. Batches are handed to the workers in turn,
+    unless key is given, in which case values are partitioned by the hash of
+    key(value), so that values with equal keys are handled by the same
+    worker. Results are pushed on as they come, or, if ordered, in the order
+    of the batches (not possible with key). At most maxInFlight batches (by
+    default, twice the number of workers) are processed at a time. """
+
+    import multiprocessing
+
+    if ordered and key is not None:
+        raise Exception(
+            "Values partitioned by key cannot be passed on in order.")
+
+    workers = workers or multiprocessing.cpu_count()
+    maxInFlight = maxInFlight or 2 * workers
+
+    outputs = multiprocessing.Queue()
+    inputs = [multiprocessing.Queue() for _ in range(workers)]
+    processes = [
+        multiprocessing.Process(
+            target=_work, args=(factory, inputs[index], outputs, index))
+        for index in range(workers)]
+    for process in processes:
+        process.daemon = True
+        process.start()
+
+    results = _Results(processes, outputs, target, ordered)
+    batches = [[] for _ in range(workers)]
+    batchIndex = 0
+
+    try:
+        try:
+            while True:
+                val = (yield)
+
+                if key is None:
+                    shard = batchIndex % workers
+                else:
+                    shard = hash(key(val)) % workers
+
+                batch = batches[shard]
+                batch.append(val)
+                if len(batch) < batchSize:
+                    continue
+
+                inputs[shard].put((batchIndex, batch))
+                batches[shard] = []
+                batchIndex += 1
+                results.inFlight += 1
+
+                while results.receive(block=False):
+                    pass
+                while results.inFlight >= maxInFlight:
+                    results.receive()
+
+        except GeneratorExit:
+            for shard, batch in enumerate(batches):
+                if batch:
+                    inputs[shard].put((batchIndex, batch))
+                    batchIndex += 1
+                    results.inFlight += 1
+
+            for shardInputs in inputs:
+                shardInputs.put(None)
+
+            results.finish(workers)
+            target.close()
+
+    finally:
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
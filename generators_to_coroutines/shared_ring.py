@@ -0,0 +1,273 @@
+""" Transport of records between the processes of a push pipeline through a
+ring buffer in shared memory (python 3.8 or later).
+
+Passing values through a multiprocessing.Queue pickles them one at a time,
+and hands them over through a pipe. A SharedRing is a single producer, single
+consumer ring buffer in a multiprocessing.shared_memory block, that a pipeline
+in one process sends records to, and that a driver in another process pushes
+on to the rest of the pipeline:
+
+    ring = SharedRing(size=1 << 22)
+
+    # in the producing process
+    pushFromIterable(lines, genFilter.co(isValid, coRingSend(ring)))
+
+    # in the consuming process
+    pushFromRing(ring, genMap.co(parse, target))
+
+Records are bytes, either of any length, or of exactly recordSize bytes,
+given when creating the ring. Other values can be sent by passing functions
+to encode and decode them, e.g. pickle.dumps and pickle.loads. Closing the
+sending coroutine ends the push in the receiving process, which then closes
+its target, like the end of the iterable does for pushFromIterable. """
+
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+from .decorators import coroutine
+from .instrumentation import timer
+from .tools import PushStats
+
+
+_counter = struct.Struct('<Q')
+_length = struct.Struct('<I')
+
+# the counters written by each side are on separate cache lines
+_HEAD = 0
+_TAIL = 64
+_SENDER_CLOSED = 128
+_RECEIVER_CLOSED = 136
+_RECORD_SIZE = 144
+_CAPACITY = 152
+_DATA = 192
+
+# in place of a length, tells that the record continues at the start of the
+# ring
+_WRAP = 0xffffffff
+
+_MAX_BACKOFF = 0.001
+
+
+class _AttachingTracker(object):
+    """ Stands in for the resource tracker in shared_memory while attaching to
+    a ring, ignoring the registration of the segment """
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    def register(self, name, rtype):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self.tracker, name)
+
+
+_attachLock = threading.Lock()
+
+
+def _attach(name):
+    """ Attach to an existing shared memory block, without tracking it. Before
+    python 3.13, attaching registers the block with the resource tracker of
+    the attaching process, which unlinks it when that process exits, and
+    unregistering it again would also drop the registration of the creating
+    process when both share a tracker, as with multiprocessing. """
+
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        pass
+
+    with _attachLock:
+        tracker = shared_memory.resource_tracker
+        shared_memory.resource_tracker = _AttachingTracker(tracker)
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            shared_memory.resource_tracker = tracker
+
+
+def _backoff(delay):
+    """ Sleep while waiting for the other side, for longer each time, up to
+    _MAX_BACKOFF. Returns the next delay. """
+
+    time.sleep(delay)
+    return min(max(delay * 2, 1e-6), _MAX_BACKOFF)
+
+
+class SharedRing(object):
+    """ A ring buffer of records in shared memory, with one sender and one
+    receiver. Without a name, creates a ring with size bytes of storage,
+    holding records of recordSize bytes, or of any length if None.
+    Otherwise, attaches to the existing ring with that name, e.g. in another
+    process. Rings are pickled by name, so can be passed to other processes.
+
+    The process that created the ring should unlink it once done. """
+
+    def __init__(self, name=None, size=1 << 20, recordSize=None):
+        if name is None:
+            if size < 1:
+                raise ValueError("The ring size must be positive, not %d" %
+                                 size)
+            if recordSize is not None and not 1 <= recordSize <= size:
+                raise ValueError("Records of %d bytes do not fit in a ring of "
+                                 "%d bytes" % (recordSize, size))
+            if recordSize is not None:
+                # whole records fit in the ring, and never wrap
+                size -= size % recordSize
+            self.memory = shared_memory.SharedMemory(
+                create=True, size=_DATA + size)
+            _counter.pack_into(self.memory.buf, _RECORD_SIZE, recordSize or 0)
+            _counter.pack_into(self.memory.buf, _CAPACITY, size)
+        else:
+            self.memory = _attach(name)
+
+        self.name = self.memory.name
+        self.recordSize = self._read(_RECORD_SIZE) or None
+        self.capacity = self._read(_CAPACITY)
+
+    def __reduce__(self):
+        return (SharedRing, (self.name,))
+
+    def _read(self, offset):
+        return _counter.unpack_from(self.memory.buf, offset)[0]
+
+    def _write(self, offset, value):
+        _counter.pack_into(self.memory.buf, offset, value)
+
+    def close(self):
+        """ Detach from the shared memory """
+        self.memory.close()
+
+    def unlink(self):
+        """ Free the shared memory, once all processes are done with it """
+        self.memory.unlink()
+
+
+@coroutine
+def coRingSend(ring, encode=None):
+    """ Send the values sent to this coroutine as records through the ring,
+    encoded by encode if given. Blocks while the ring is full. Closing tells
+    the receiver that no more records will come. Raises StopIteration once
+    the receiver has finished. """
+
+    buf = ring.memory.buf
+    capacity = ring.capacity
+    recordSize = ring.recordSize
+    head = ring._read(_HEAD)
+
+    try:
+        while True:
+            record = (yield)
+            if encode is not None:
+                record = encode(record)
+
+            size = len(record)
+            position = head % capacity
+
+            if recordSize is not None:
+                if size != recordSize:
+                    raise ValueError("Records must have %d bytes, not %d" %
+                                     (recordSize, size))
+                needed = size
+            else:
+                needed = _length.size + size
+                if needed > capacity - _length.size:
+                    raise ValueError("A record of %d bytes does not fit in "
+                                     "the ring" % size)
+                if capacity - position < needed:
+                    # skip to the start of the ring
+                    needed += capacity - position
+
+            if ring._read(_RECEIVER_CLOSED):
+                return
+
+            delay = 0
+            while capacity - (head - ring._read(_TAIL)) < needed:
+                if ring._read(_RECEIVER_CLOSED):
+                    return
+                delay = _backoff(delay)
+
+            if recordSize is None:
+                if capacity - position < _length.size + size:
+                    if capacity - position >= _length.size:
+                        _length.pack_into(buf, _DATA + position, _WRAP)
+                    head += capacity - position
+                    position = 0
+                start = _DATA + position + _length.size
+                buf[start:start + size] = record
+                _length.pack_into(buf, _DATA + position, size)
+                head += _length.size + size
+            else:
+                start = _DATA + position
+                buf[start:start + size] = record
+                head += size
+
+            # the record is complete before the receiver sees it
+            ring._write(_HEAD, head)
+    except GeneratorExit:
+        ring._write(_SENDER_CLOSED, 1)
+
+
+def pushFromRing(ring, target, decode=None):
+    """ Push the records sent through the ring to a target, decoded by decode
+    if given, until the sender closes, and close the target. Returns
+    PushStats.
+
+    Without decode, records are pushed as memoryviews of the shared memory,
+    which stay valid only until the call to send they are passed to returns:
+    stages that keep them must copy them, e.g. with bytes(). """
+
+    buf = ring.memory.buf
+    capacity = ring.capacity
+    recordSize = ring.recordSize
+    tail = ring._read(_TAIL)
+    send = target.send
+    pushed = 0
+    start = timer()
+    delay = 0
+
+    try:
+        while True:
+            head = ring._read(_HEAD)
+
+            if head == tail:
+                # the sender closes after writing its last head
+                if ring._read(_SENDER_CLOSED) and \
+                        ring._read(_HEAD) == tail:
+                    break
+                delay = _backoff(delay)
+                continue
+            delay = 0
+
+            while tail < head:
+                position = tail % capacity
+
+                if recordSize is None:
+                    if capacity - position < _length.size:
+                        tail += capacity - position
+                        continue
+                    size = _length.unpack_from(buf, _DATA + position)[0]
+                    if size == _WRAP:
+                        tail += capacity - position
+                        continue
+                    recordStart = _DATA + position + _length.size
+                    tail += _length.size + size
+                else:
+                    size = recordSize
+                    recordStart = _DATA + position
+                    tail += size
+
+                record = buf[recordStart:recordStart + size]
+                send(record if decode is None else decode(record))
+                pushed += 1
+
+            # hand the space of the whole batch back to the sender at once
+            ring._write(_TAIL, tail)
+    except StopIteration:
+        ring._write(_RECEIVER_CLOSED, 1)
+        return PushStats(pushed, timer() - start, True)
+
+    target.close()
+    return PushStats(pushed, timer() - start, True)
@@ -1,11 +1,47 @@
 from . import tools
-from .decorators import hasInvertibleMethods, invertibleGenerator, coroutine
-
+from .decorators import hasInvertibleMethods, invertibleGenerator, coroutine, \
+    enableLazyConversion, disableLazyConversion
+from . import ast_transformers
+from .ast_transformers import InvertGenerator, InvertGeneratorBatched, \
+    transformAstWith
+from .cache import CodeCache
+from . import concurrency
+from .fusion import fusePipeline
+from .mapped import pushMappedFile
+from .sharding import coShard
+from . import instrumentation
+from .modules import invertModule
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import traceback
 import unittest
+import warnings
 import six
 from nose.tools import assert_equal, raises
 from nose_parameterized import parameterized
 
+if sys.version_info >= (3, 6):
+    import asyncio
+    from . import aio
+
+if sys.version_info >= (3, 8):
+    import multiprocessing
+    import pickle
+    from . import shared_ring
+
+try:
+    import numpy
+    from . import numeric
+except ImportError:
+    numpy = None
+
 
 exampleGlobal = 42
 
@@ -25,6 +61,16 @@ def really():
     return deeply
 
 
+def makeScaler(factor):
+
+    @invertibleGenerator
+    def genScale(iterable):
+        for val in iterable:
+            yield val * factor
+
+    return genScale
+
+
 @invertibleGenerator
 def genAfterLoop(iterable):
 
@@ -34,6 +80,15 @@ def genAfterLoop(iterable):
     yield exampleGlobal
 
 
+@invertibleGenerator
+def genRaising(iterable):
+
+    for val in iterable:
+        if val is None:
+            raise ValueError("no value")
+        yield val
+
+
 @invertibleGenerator
 def genBeforeLoop(iterable):
 
@@ -149,6 +204,18 @@ class ClassWithGeneratorMethod(object):
         yield self.exampleClassLocal
 
 
+@hasInvertibleMethods
+class ClassWithScalingMethod(object):
+
+    def __init__(self, factor):
+        self.factor = factor
+
+    @invertibleGenerator
+    def scale(self, iterable):
+        for val in iterable:
+            yield val * self.factor
+
+
 class DummyCoroutine(object):
     """ A dummy "sink" coroutine that records all values sent to it. """
 
@@ -175,6 +242,79 @@ def runCoroutinePipeline(pipeline, iterable):
     return dummy.results
 
 
+def runBatchedCoroutinePipeline(pipeline, iterable, chunkSize=2):
+
+    dummy = DummyCoroutine()
+    tools.pushChunksFromIterable(iterable, pipeline(dummy), chunkSize)
+
+    return [val for chunk in dummy.results for val in chunk]
+
+
+def square(val):
+    return val * val
+
+
+def squareOddPipeline(target):
+    """ A picklable pipeline factory, for sharding. """
+    return tools.genFilter.co(
+        lambda val: val % 2, tools.genMap.co(square, target))
+
+
+def sendRecords(ring, records, encode=None):
+    """ Send records through a ring, e.g. from another process """
+    tools.pushAll(records, shared_ring.coRingSend(ring, encode))
+
+
+def failingPipeline(target):
+    return tools.genMap.co(lambda val: 1 / 0, target)
+
+
+def exitingPipeline(target):
+    """ Exits the worker process abruptly, like the OOM killer would """
+    return tools.genMap.co(lambda val: os._exit(1), target)
+
+
+class DummyAsyncCoroutine(DummyCoroutine):
+    """ An asynchronous version of DummyCoroutine, that lets other tasks run
+    on every value sent. """
+
+    def asend(self, val):
+        self.send(val)
+        return asyncio.sleep(0)
+
+    def aclose(self):
+        self.close()
+        return asyncio.sleep(0)
+
+
+class AsyncIterable(object):
+    """ An asynchronous iterable over the values of an iterable. """
+
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        for val in self.iterator:
+            return asyncio.sleep(0, result=val)
+        raise StopAsyncIteration
+
+
+def runAsyncCoroutinePipeline(pipeline, iterable):
+
+    dummy = DummyAsyncCoroutine()
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(
+            aio.apushFromIterable(iterable, pipeline(dummy)))
+    finally:
+        loop.close()
+
+    return dummy.results
+
+
 def runGeneratorPipeline(pipeline, iterable):
     results = [val for val in pipeline(iterable)]
     return results
@@ -216,6 +356,19 @@ class TestEquivalence(unittest.TestCase):
             lambda i: tools.genFilter.co(iseven, i),
             l)
 
+    @parameterized.expand(testParameters)
+    def test_parallel_map(self, _, l):
+        double = lambda x: x * 2
+
+        assertEqualPipelines(
+            lambda i: tools.genMap(double, i),
+            lambda t: tools.genParallelMap.co(double, t),
+            l)
+        assertEqualPipelines(
+            lambda i: tools.genParallelMap(double, i, window=1),
+            lambda t: tools.genParallelMap.co(double, t, 3, 2),
+            l)
+
     @parameterized.expand(testParameters)
     def test_after_loop(self, _, l):
         assertEqualPipelines(
@@ -260,6 +413,14 @@ class TestEquivalence(unittest.TestCase):
             func,
             func.co, l)
 
+    @parameterized.expand(testParameters)
+    def test_closure(self, _, l):
+        for factor in [2, 3]:
+            func = makeScaler(factor)
+            assertEqualPipelines(
+                func,
+                func.co, l)
+
     @raises(Exception)
     def test_cannot_convert_two_iterable_generator(self):
         def twoInput(in1, in2):
@@ -282,3 +443,1352 @@ class TestEquivalence(unittest.TestCase):
         assertEqualPipelines(
             genUsingForAndNext,
             genUsingForAndNext.co, l)
+
+
+def assertEqualBatchedPipelines(genPipeline, coPipeline, iterable):
+
+    cachedIterable = list(iterable)
+    for chunkSize in [1, 2, 3]:
+        assert_equal(
+            runGeneratorPipeline(genPipeline, cachedIterable.__iter__()),
+            runBatchedCoroutinePipeline(coPipeline, cachedIterable, chunkSize))
+
+
+class TestBatchedEquivalence(unittest.TestCase):
+
+    testParameters = TestEquivalence.testParameters
+
+    @parameterized.expand(testParameters)
+    def test_pair(self, _, l):
+        assertEqualBatchedPipelines(
+            tools.genPairs,
+            tools.genPairs.co_batch, l)
+
+    @parameterized.expand(testParameters)
+    def test_filter_map(self, _, l):
+        iseven = lambda x: x % 2 == 0
+        double = lambda x: x * 2
+
+        assertEqualBatchedPipelines(
+            lambda i: tools.genMap(double, tools.genFilter(iseven, i)),
+            lambda t: tools.genFilter.co_batch(
+                iseven, tools.genMap.co_batch(double, t)),
+            l)
+
+    @parameterized.expand(testParameters)
+    def test_before_and_after_loop(self, _, l):
+        assertEqualBatchedPipelines(
+            lambda i: genAfterLoop(genBeforeLoop(i)),
+            lambda t: genBeforeLoop.co_batch(genAfterLoop.co_batch(t)),
+            l)
+
+    @parameterized.expand(testParameters)
+    def test_class_method(self, _, l):
+        obj = ClassWithGeneratorMethod(7)
+        assertEqualBatchedPipelines(
+            obj.gen,
+            obj.gen.co_batch, l)
+
+    @raises(Exception)
+    def test_cannot_convert_break(self):
+        genTwoLoops.co_batch(DummyCoroutine())
+
+    @raises(Exception)
+    def test_cannot_convert_next(self):
+        genUsingNext.co_batch(DummyCoroutine())
+
+
+def assertEqualAsyncPipelines(genPipeline, coPipeline, iterable):
+
+    cachedIterable = list(iterable)
+    for source in [cachedIterable, AsyncIterable(cachedIterable)]:
+        assert_equal(
+            runGeneratorPipeline(genPipeline, cachedIterable.__iter__()),
+            runAsyncCoroutinePipeline(coPipeline, source))
+
+
+@unittest.skipIf(sys.version_info < (3, 6),
+                 "asynchronous generators require python 3.6")
+class TestAsyncEquivalence(unittest.TestCase):
+
+    testParameters = TestEquivalence.testParameters
+
+    @parameterized.expand(testParameters)
+    def test_filter_map_pairs(self, _, l):
+        iseven = lambda x: x % 2 == 0
+        double = lambda x: x * 2
+
+        assertEqualAsyncPipelines(
+            lambda i: tools.genPairs(
+                tools.genMap(double, tools.genFilter(iseven, i))),
+            lambda t: tools.genFilter.aco(
+                iseven, tools.genMap.aco(double, tools.genPairs.aco(t))),
+            l)
+
+    @parameterized.expand(testParameters)
+    def test_before_and_after_loop(self, _, l):
+        assertEqualAsyncPipelines(
+            lambda i: genAfterLoop(genBeforeLoop(i)),
+            lambda t: genBeforeLoop.aco(genAfterLoop.aco(t)),
+            l)
+
+    @parameterized.expand(testParameters)
+    def test_two_loops(self, _, l):
+        assertEqualAsyncPipelines(
+            genTwoLoops,
+            genTwoLoops.aco, l)
+
+    @parameterized.expand(testParameters)
+    def test_class_method(self, _, l):
+        obj = ClassWithGeneratorMethod(7)
+        assertEqualAsyncPipelines(
+            obj.gen,
+            obj.gen.aco, l)
+
+    def test_concurrent_pipelines(self):
+        sinks = [DummyAsyncCoroutine() for _ in range(100)]
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(asyncio.wait([
+                loop.create_task(aio.apushFromIterable(
+                    range(10), tools.genPairs.aco(sink)))
+                for sink in sinks]))
+        finally:
+            loop.close()
+
+        for sink in sinks:
+            assert_equal(sink.results, [(0, 1), (2, 3), (4, 5), (6, 7),
+                                        (8, 9)])
+            assert sink.closed
+
+
+class TestObjectEquivalence(unittest.TestCase):
+
+    testParameters = TestEquivalence.testParameters
+
+    @parameterized.expand(testParameters)
+    def test_pair(self, _, l):
+        assertEqualPipelines(
+            tools.genPairs,
+            tools.genPairs.co_object, l)
+
+    @parameterized.expand(testParameters)
+    def test_filter_map(self, _, l):
+        iseven = lambda x: x % 2 == 0
+        double = lambda x: x * 2
+
+        assertEqualPipelines(
+            lambda i: tools.genMap(double, tools.genFilter(iseven, i)),
+            lambda t: tools.genFilter.co_object(
+                iseven, tools.genMap.co_object(double, t)),
+            l)
+
+    @parameterized.expand(testParameters)
+    def test_after_loop(self, _, l):
+        assertEqualPipelines(
+            genAfterLoop,
+            genAfterLoop.co_object, l)
+
+    @parameterized.expand(testParameters)
+    def test_closure(self, _, l):
+        scale = makeScaler(3)
+        assertEqualPipelines(scale, scale.co_object, l)
+
+    @parameterized.expand([
+        ("co", lambda target: genAfterLoop.co(target)),
+        ("co_object", lambda target: genAfterLoop.co_object(target)),
+    ])
+    def test_close_like_coroutine(self, _, makeStage):
+        dummy = DummyCoroutine()
+        stage = makeStage(coRecordClose(dummy))
+        stage.send(1)
+        stage.close()
+
+        # the target is released, and so closed, while the stage is alive
+        assert_equal(dummy.results, [1, exampleGlobal])
+        assert dummy.closed
+
+        stage.close()
+        self.assertRaises(StopIteration, stage.send, 2)
+        assert_equal(dummy.resultsAfterClose, [])
+
+    @parameterized.expand(testParameters)
+    def test_class_method(self, _, l):
+        obj = ClassWithScalingMethod(5)
+        assertEqualPipelines(obj.scale, obj.scale.co_object, l)
+
+    def test_slots(self):
+        stage = tools.genPairs.co_object(DummyCoroutine())
+        assert not hasattr(stage, '__dict__')
+        assert_equal(stage.paired, False)
+
+    @raises(Exception)
+    def test_cannot_convert_yield_before_loop(self):
+        genBeforeLoop.co_object(DummyCoroutine())
+
+    @raises(Exception)
+    def test_cannot_convert_break(self):
+        genTwoLoops.co_object(DummyCoroutine())
+
+
+class TestFusion(unittest.TestCase):
+
+    testParameters = TestEquivalence.testParameters
+
+    @parameterized.expand(testParameters)
+    def test_filter_map_pairs(self, _, l):
+        iseven = lambda x: x % 2 == 0
+        double = lambda x: x * 2
+
+        assertEqualPipelines(
+            lambda i: tools.genPairs(tools.genMap(
+                double, tools.genFilter(iseven, tools.genPassthrough(i)))),
+            fusePipeline(tools.genPassthrough, (tools.genFilter, iseven),
+                         (tools.genMap, double), tools.genPairs),
+            l)
+
+    @parameterized.expand(testParameters)
+    def test_after_loop(self, _, l):
+        assertEqualPipelines(
+            lambda i: tools.genPairs(genAfterLoop(genAfterLoop(i))),
+            fusePipeline(genAfterLoop, genAfterLoop, tools.genPairs),
+            l)
+
+    @parameterized.expand(testParameters)
+    def test_closure(self, _, l):
+        assertEqualPipelines(
+            lambda i: makeScaler(3)(makeScaler(2)(i)),
+            fusePipeline(makeScaler(2), makeScaler(3)),
+            l)
+
+    @raises(Exception)
+    def test_cannot_fuse_break(self):
+        fusePipeline(tools.genPassthrough, genTwoLoops)
+
+    @raises(Exception)
+    def test_cannot_fuse_yield_before_loop(self):
+        fusePipeline(genBeforeLoop)
+
+
+@coroutine
+def coRecordClose(target):
+    """ Pass values on, closing the target when closed. """
+    try:
+        while True:
+            target.send((yield))
+    except GeneratorExit:
+        target.close()
+
+
+@coroutine
+def coReceiveTwo(target):
+    """ Pass on two values, then finish. """
+    for _ in range(2):
+        target.send((yield))
+
+
+class TestPushDrivers(unittest.TestCase):
+
+    def test_push_all(self):
+        dummy = DummyCoroutine()
+        stats = tools.pushAll(range(5), dummy)
+
+        assert_equal(dummy.results, [0, 1, 2, 3, 4])
+        assert dummy.closed
+        assert_equal(stats.pushed, 5)
+        assert stats.exhausted
+        assert stats.elapsed >= 0
+
+    @parameterized.expand([
+        ("sized", lambda: range(5)),
+        ("unsized", lambda: (val for val in range(5))),
+    ])
+    def test_push_all_to_finished_target(self, _, makeIterable):
+        dummy = DummyCoroutine()
+        stats = tools.pushAll(makeIterable(), coReceiveTwo(dummy))
+
+        # the second value finishes the target
+        assert_equal(dummy.results, [0, 1])
+        assert_equal(stats.pushed, 1)
+
+    @parameterized.expand([
+        ("sized", lambda: [0, 1]),
+        ("unsized", lambda: (val for val in [0, 1])),
+    ])
+    def test_push_to_target_finishing_on_last_value(self, _, makeIterable):
+        stats = tools.pushAll(makeIterable(), coReceiveTwo(DummyCoroutine()))
+        assert_equal(stats.pushed, 1)
+
+        stats = tools.pushUpTo(iter(makeIterable()),
+                               coReceiveTwo(DummyCoroutine()), 2)
+        assert_equal(stats.pushed, 1)
+        assert stats.exhausted
+
+    def test_push_all_unsized(self):
+        dummy = DummyCoroutine()
+        stats = tools.pushAll((val for val in range(5)), dummy)
+
+        assert_equal(dummy.results, [0, 1, 2, 3, 4])
+        assert_equal(stats.pushed, 5)
+
+    def test_push_up_to(self):
+        dummy = DummyCoroutine()
+        iterator = iter(range(5))
+
+        stats = tools.pushUpTo(iterator, dummy, 3)
+        assert_equal(dummy.results, [0, 1, 2])
+        assert_equal(stats.pushed, 3)
+        assert not stats.exhausted
+        assert not dummy.closed
+
+        stats = tools.pushUpTo(iterator, dummy, 3)
+        assert_equal(dummy.results, [0, 1, 2, 3, 4])
+        assert_equal(stats.pushed, 2)
+        assert stats.exhausted
+
+    def test_push_during(self):
+        dummy = DummyCoroutine()
+        iterator = iter(range(1000))
+
+        stats = tools.pushDuring(iterator, dummy, 0, sliceSize=10)
+        assert_equal(dummy.results, list(range(10)))
+        assert not stats.exhausted
+
+        stats = tools.pushDuring(iterator, dummy, 60, sliceSize=10)
+        assert_equal(dummy.results, list(range(1000)))
+        assert_equal(stats.pushed, 990)
+        assert stats.exhausted
+        assert not dummy.closed
+
+
+@unittest.skipIf(numpy is None, "numeric stages require numpy")
+class TestNumericStages(unittest.TestCase):
+
+    values = list(range(11))
+
+    def _pushChunks(self, makePipeline, chunkSize=4):
+        dummy = DummyCoroutine()
+        numeric.pushArray(numpy.array(self.values, dtype=float),
+                          makePipeline(numeric.genArrayElements.co(dummy)),
+                          chunkSize)
+        return dummy.results
+
+    @parameterized.expand([(1,), (3,), (4,), (16,)])
+    def test_chunks_round_trip(self, chunkSize):
+        dummy = DummyCoroutine()
+        tools.pushAll(self.values, numeric.genArrayChunks.co(
+            numeric.genArrayElements.co(dummy), chunkSize))
+
+        assert_equal(dummy.results, self.values)
+        assert_equal(
+            [len(chunk) for chunk in
+             numeric.genArrayChunks(self.values, chunkSize)],
+            [min(chunkSize, len(self.values) - start)
+             for start in range(0, len(self.values), chunkSize)])
+
+    def test_map(self):
+        assert_equal(
+            self._pushChunks(
+                lambda target: numeric.genChunkMap.co(numpy.square, target)),
+            [val * val for val in self.values])
+
+    def test_filter(self):
+        assert_equal(
+            self._pushChunks(lambda target: numeric.genChunkFilter.co(
+                lambda chunk: chunk > 5, target)),
+            [val for val in self.values if val > 5])
+
+    @parameterized.expand([(1,), (3,), (4,)])
+    def test_pairs(self, chunkSize):
+        assert_equal(
+            [tuple(pair) for pair in self._pushChunks(
+                numeric.genChunkPairs.co, chunkSize)],
+            list(tools.genPairs(self.values)))
+
+    def test_generator_form(self):
+        chunks = numeric.genArrayChunks(self.values, 3)
+        assert_equal(
+            list(numeric.genArrayElements(numeric.genChunkFilter(
+                lambda chunk: chunk % 2 == 1,
+                numeric.genChunkMap(numpy.negative, chunks)))),
+            [-val for val in self.values if val % 2])
+
+
+class TestWindows(unittest.TestCase):
+
+    values = list(range(8))
+
+    def _both(self, stage, size, **kwargs):
+        """ Results of the generator and of its coroutine, which must match """
+        dummy = DummyCoroutine()
+        tools.pushAll(self.values, stage.co(size, dummy, **kwargs))
+        assert_equal(list(stage(size, self.values, **kwargs)), dummy.results)
+        return dummy.results
+
+    @parameterized.expand([
+        (1, [(val,) for val in range(8)]),
+        (3, [(0, 1, 2), (3, 4, 5), (6, 7)]),
+        (4, [(0, 1, 2, 3), (4, 5, 6, 7)]),
+        (10, [tuple(range(8))]),
+    ])
+    def test_chunk(self, size, expected):
+        assert_equal(self._both(tools.genChunk, size), expected)
+
+    @parameterized.expand([
+        (3, 1, [(0, 1, 2), (1, 2, 3), (2, 3, 4), (3, 4, 5), (4, 5, 6),
+                (5, 6, 7)]),
+        (3, 2, [(0, 1, 2), (2, 3, 4), (4, 5, 6), (6, 7)]),
+        (2, 3, [(0, 1), (3, 4), (6, 7)]),
+        (3, 5, [(0, 1, 2), (5, 6, 7)]),
+        (2, 4, [(0, 1), (4, 5)]),
+        (10, 1, [tuple(range(8))]),
+    ])
+    def test_window(self, size, step, expected):
+        assert_equal(self._both(tools.genWindow, size, step=step), expected)
+
+    def test_time_window(self):
+        # each value advances the clock by a second
+        times = iter(range(100))
+        clock = lambda: next(times)
+        dummy = DummyCoroutine()
+        tools.pushAll(self.values, tools.genTimeWindow.co(3, dummy, clock))
+
+        assert_equal(dummy.results, [(0, 1, 2), (3, 4, 5), (6, 7)])
+
+    @parameterized.expand([
+        (3, [[0, 1, 2], [3, 4, 5], [6, 7]]),
+        (8, [list(range(8))]),
+    ])
+    def test_batch_by_size(self, size, expected):
+        assert_equal(self._both(tools.genBatch, size), expected)
+
+    def test_batch_by_time(self):
+        # each value advances the clock by a second
+        times = iter(range(100))
+        clock = lambda: next(times)
+        dummy = DummyCoroutine()
+        tools.pushAll(self.values, tools.genBatch.co(4, dummy, 2, clock))
+
+        assert_equal(dummy.results, [[0, 1, 2], [3, 4, 5], [6, 7]])
+
+    @parameterized.expand([
+        ("chunk_size", lambda target: tools.genChunk.co(0, target)),
+        ("window_size", lambda target: tools.genWindow.co(-1, target)),
+        ("window_step", lambda target: tools.genWindow.co(2, target, 0)),
+        ("batch_size", lambda target: tools.genBatch.co(0, target)),
+    ])
+    @raises(ValueError)
+    def test_invalid_sizes(self, _, makeStage):
+        makeStage(DummyCoroutine())
+
+    def test_pairs_drop_odd_value(self):
+        assert_equal(list(tools.genPairs(range(5))), [(0, 1), (2, 3)])
+
+
+class TestRouting(unittest.TestCase):
+
+    def test_split_closes_targets(self):
+        odd, even = DummyCoroutine(), DummyCoroutine()
+        tools.pushAll(range(5), tools.coSplit(
+            lambda val: val % 2, odd, even))
+
+        assert_equal(odd.results, [1, 3])
+        assert_equal(even.results, [0, 2, 4])
+        assert odd.closed and even.closed
+
+    def test_route_by_key(self):
+        targets = dict((key, DummyCoroutine()) for key in range(3))
+        default = DummyCoroutine()
+        tools.pushAll(range(10), tools.coRoute(
+            lambda val: val % 4, targets, default))
+
+        assert_equal(targets[0].results, [0, 4, 8])
+        assert_equal(targets[2].results, [2, 6])
+        assert_equal(default.results, [3, 7])
+        assert all(target.closed for target in targets.values())
+        assert default.closed
+
+    @raises(KeyError)
+    def test_route_unknown_key(self):
+        tools.coRoute(len, {}).send('value')
+
+    def test_route_factory_and_eviction(self):
+        created = []
+
+        def factory(key):
+            created.append((key, DummyCoroutine()))
+            return created[-1][1]
+
+        static = DummyCoroutine()
+        tools.pushAll([0, 1, 2, 1, 3, 1, 2], tools.coRoute(
+            lambda val: val, {0: static}, factory=factory, maxRoutes=2))
+
+        # 2 is evicted when 3 arrives, since 1 was used more recently
+        assert_equal([(key, target.results) for key, target in created],
+                     [(1, [1, 1, 1]), (2, [2]), (3, [3]), (2, [2])])
+        assert all(target.closed for _, target in created)
+        assert_equal(static.results, [0])
+        assert static.closed
+
+
+class TestMappedFile(unittest.TestCase):
+
+    lines = [b'first', b'', b'third line', b'4']
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'records.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, contents):
+        with open(self.path, 'wb') as recordsFile:
+            recordsFile.write(contents)
+
+    def _push(self, **kwargs):
+        dummy = DummyCoroutine()
+        stats = pushMappedFile(self.path, dummy, **kwargs)
+        assert dummy.closed
+        assert_equal(stats.pushed, len(dummy.results))
+        return dummy.results
+
+    @parameterized.expand([
+        ("trailing_separator", b'\n'),
+        ("no_trailing_separator", b''),
+    ])
+    def test_views(self, _, end):
+        self._write(b'\n'.join(self.lines) + end)
+
+        records = self._push(chunkSize=3)
+        assert all(isinstance(record, memoryview) for record in records)
+        assert_equal([record.tobytes() for record in records], self.lines)
+
+    def test_offsets(self):
+        contents = b'\r\n'.join(self.lines)
+        self._write(contents)
+
+        assert_equal(
+            [contents[start:stop]
+             for start, stop in self._push(separator=b'\r\n',
+                                           offsets=True)],
+            self.lines)
+
+    def test_empty_file(self):
+        self._write(b'')
+        assert_equal(self._push(), [])
+
+    def test_decode_in_pipeline(self):
+        self._write(u'caf\xe9\nth\xe9\n'.encode('utf-8'))
+
+        dummy = DummyCoroutine()
+        pushMappedFile(self.path, tools.genFilter.co(
+            lambda record: record[:1] == b't', tools.genDecode.co(dummy)))
+        assert_equal(dummy.results, [u'th\xe9'])
+
+
+class GatedCoroutine(DummyCoroutine):
+    """ Blocks receiving values until the gate is opened """
+
+    def __init__(self):
+        super(GatedCoroutine, self).__init__()
+        self.gate = threading.Event()
+
+    def send(self, val):
+        self.gate.wait()
+        super(GatedCoroutine, self).send(val)
+
+
+class TestBufferedEdge(unittest.TestCase):
+
+    values = list(range(100))
+
+    def test_block(self):
+        dummy = DummyCoroutine()
+        edge = concurrency.BufferedEdge(dummy, maxSize=4)
+        tools.pushAll(self.values, edge)
+
+        assert_equal(dummy.results, self.values)
+        assert dummy.closed
+        metrics = edge.metrics()
+        assert_equal(metrics.depth, 0)
+        assert metrics.maxDepth <= 4
+
+    def test_block_stalls(self):
+        gated = GatedCoroutine()
+        edge = concurrency.BufferedEdge(gated, maxSize=2)
+        threading.Timer(0.05, gated.gate.set).start()
+        tools.pushAll(self.values, edge)
+
+        assert_equal(gated.results, self.values)
+        assert edge.metrics().stalls > 0
+        assert edge.metrics().stallTime > 0
+
+    def test_drop(self):
+        gated = GatedCoroutine()
+        edge = concurrency.BufferedEdge(gated, maxSize=4,
+                                        policy=concurrency.DROP)
+        tools.pushAll(self.values, edge, close=False)
+        gated.gate.set()
+        edge.close()
+
+        # the worker holds on to the values it took, at most a full buffer,
+        # while the buffer fills up again
+        metrics = edge.metrics()
+        assert_equal(len(gated.results) + metrics.dropped, len(self.values))
+        assert len(gated.results) <= 8
+        assert_equal(gated.results, sorted(gated.results))
+
+    def test_spill(self):
+        gated = GatedCoroutine()
+        edge = concurrency.BufferedEdge(gated, maxSize=4,
+                                        policy=concurrency.SPILL)
+        tools.pushAll(self.values[:50], edge, close=False)
+        gated.gate.set()
+        tools.pushAll(self.values[50:], edge)
+
+        assert_equal(gated.results, self.values)
+        assert edge.metrics().spilled > 0
+        assert gated.closed
+
+    def test_spill_read_back_in_slices(self):
+        class HeldRecorder(GatedCoroutine):
+            """ Records how many values the worker holds, including the one
+            being sent, which are neither pushed nor waiting in the edge """
+
+            def send(self, val):
+                self.gate.wait()
+                waiting = edge.metrics().depth
+                self.held.append(total - len(self.results) - waiting)
+                super(HeldRecorder, self).send(val)
+
+        gated = HeldRecorder()
+        gated.held = []
+        total = 50
+        edge = concurrency.BufferedEdge(gated, maxSize=4,
+                                        policy=concurrency.SPILL)
+        tools.pushAll(self.values[:total], edge, close=False)
+        gated.gate.set()
+        edge.close()
+
+        assert_equal(gated.results, self.values[:total])
+        assert edge.metrics().spilled > 0
+        assert max(gated.held) <= 4
+
+    @raises(ZeroDivisionError)
+    def test_downstream_error(self):
+        edge = concurrency.BufferedEdge(
+            tools.genMap.co(lambda val: 1 // val, DummyCoroutine()))
+        tools.pushAll([1, 0, 2], edge)
+
+    def test_finished_downstream(self):
+        dummy = DummyCoroutine()
+        edge = concurrency.BufferedEdge(coReceiveTwo(dummy), maxSize=2)
+        stats = tools.pushAll(self.values, edge)
+
+        assert_equal(dummy.results, [0, 1])
+        assert stats.pushed < len(self.values)
+
+    def test_flush(self):
+        dummy = DummyCoroutine()
+        edge = concurrency.BufferedEdge(dummy, maxSize=8)
+        tools.pushAll(self.values, edge, close=False)
+        edge.flush()
+
+        assert_equal(dummy.results, self.values)
+        assert not dummy.closed
+        edge.close()
+
+
+class TestThreadSafeIngress(unittest.TestCase):
+
+    producers = 8
+    perProducer = 500
+
+    def _produce(self, ingress, sendValues):
+        threads = [
+            threading.Thread(target=sendValues, args=(
+                ingress, [(producer, index)
+                          for index in range(self.perProducer)]))
+            for producer in range(self.producers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _check(self, results):
+        assert_equal(len(results), self.producers * self.perProducer)
+        for producer in range(self.producers):
+            assert_equal(
+                [index for sender, index in results if sender == producer],
+                list(range(self.perProducer)))
+
+    @parameterized.expand([
+        ("send", lambda ingress, values: [ingress.send(val)
+                                          for val in values]),
+        ("send_many", lambda ingress, values: [
+            ingress.sendMany(values[start:start + 64])
+            for start in range(0, len(values), 64)]),
+    ])
+    def test_concurrent_producers(self, _, sendValues):
+        dummy = DummyCoroutine()
+        ingress = concurrency.ThreadSafeIngress(
+            tools.genPassthrough.co(dummy), maxSize=100)
+        self._produce(ingress, sendValues)
+        ingress.close()
+
+        self._check(dummy.results)
+        assert ingress.metrics().maxDepth <= 100
+
+    def test_closed_at_exit(self):
+        dummy = DummyCoroutine()
+        ingress = concurrency.ThreadSafeIngress(dummy)
+        ingress.sendMany(range(10))
+
+        concurrency._closeIngresses()
+        assert_equal(dummy.results, list(range(10)))
+        assert dummy.closed
+
+    @raises(ValueError)
+    def test_send_after_close(self):
+        ingress = concurrency.ThreadSafeIngress(DummyCoroutine())
+        ingress.close()
+        ingress.send(1)
+
+
+@unittest.skipIf(sys.version_info < (3, 8),
+                 "shared memory requires python 3.8 or later")
+class TestSharedRing(unittest.TestCase):
+
+    def setUp(self):
+        self.rings = []
+
+    def tearDown(self):
+        for ring in self.rings:
+            ring.close()
+            ring.unlink()
+
+    def _ring(self, **kwargs):
+        self.rings.append(shared_ring.SharedRing(**kwargs))
+        return self.rings[-1]
+
+    def _receive(self, ring, sender, decode=None):
+        dummy = DummyCoroutine()
+        sender.start()
+        stats = shared_ring.pushFromRing(ring, tools.genMap.co(
+            bytes if decode is None else (lambda val: val), dummy), decode)
+        sender.join()
+
+        assert_equal(stats.pushed, len(dummy.results))
+        return dummy.results
+
+    @parameterized.expand([
+        ("empty", 0, None),
+        ("record_larger_than_ring", 16, 32),
+        ("empty_records", 16, 0),
+    ])
+    def test_invalid_sizes(self, _, size, recordSize):
+        self.assertRaises(ValueError, shared_ring.SharedRing,
+                          size=size, recordSize=recordSize)
+
+    def test_records_wrapping_around(self):
+        # records of varying lengths wrap around a small ring many times
+        records = [str(val).encode() * (val % 7) for val in range(500)]
+        ring = self._ring(size=64)
+
+        assert_equal(self._receive(ring, threading.Thread(
+            target=sendRecords, args=(ring, records))), records)
+
+    def test_fixed_size_records(self):
+        records = [bytes(bytearray([val % 256] * 8)) for val in range(300)]
+        ring = self._ring(size=100, recordSize=8)
+
+        assert_equal(ring.capacity, 96)
+        assert_equal(self._receive(ring, threading.Thread(
+            target=sendRecords, args=(ring, records))), records)
+
+    def test_across_processes(self):
+        values = [(val, str(val)) for val in range(1000)]
+        ring = self._ring(size=1024)
+
+        assert_equal(self._receive(ring, multiprocessing.Process(
+            target=sendRecords, args=(ring, values, pickle.dumps)),
+            pickle.loads), values)
+
+    def test_receiver_finished(self):
+        ring = self._ring(size=64)
+        dummy = DummyCoroutine()
+        sender = threading.Thread(
+            target=sendRecords, args=(ring, [b'record'] * 100))
+        sender.start()
+        stats = shared_ring.pushFromRing(ring, coReceiveTwo(dummy), bytes)
+        sender.join()
+
+        assert_equal(dummy.results, [b'record'] * 2)
+        assert_equal(stats.pushed, 1)
+
+    def test_sender_sees_receiver_finished(self):
+        ring = self._ring(size=1024)
+        sender = shared_ring.coRingSend(ring)
+        sender.send(b'first')
+        sender.send(b'second')
+        shared_ring.pushFromRing(ring, coReceiveTwo(DummyCoroutine()))
+
+        # there is room left in the ring
+        self.assertRaises(StopIteration, sender.send, b'third')
+
+    def test_attaching_process_leaves_ring_alone(self):
+        ring = self._ring(size=64)
+        subprocess.check_call([
+            sys.executable, '-c',
+            'from generators_to_coroutines.shared_ring import SharedRing; '
+            'SharedRing(%r).close()' % ring.name])
+
+        # still there for the creating process to attach and unlink, after
+        # the resource tracker of the other process had time to clean up
+        for _ in range(20):
+            shared_ring.SharedRing(ring.name).close()
+            time.sleep(0.05)
+
+    @raises(ValueError)
+    def test_record_too_large(self):
+        shared_ring.coRingSend(self._ring(size=64)).send(b'x' * 64)
+
+
+class TestTimedBatcher(unittest.TestCase):
+
+    def test_flush_when_full_and_on_close(self):
+        dummy = DummyCoroutine()
+        tools.pushAll(range(7), concurrency.TimedBatcher(dummy, 3, 60))
+
+        assert_equal(dummy.results, [[0, 1, 2], [3, 4, 5], [6]])
+        assert dummy.closed
+
+    def test_flush_on_time(self):
+        flushed = threading.Event()
+
+        class Target(DummyCoroutine):
+            def send(self, val):
+                super(Target, self).send(val)
+                flushed.set()
+
+        target = Target()
+        batcher = concurrency.TimedBatcher(target, 100, 0.01)
+        batcher.send(1)
+        batcher.send(2)
+
+        # flushed without any more values arriving
+        assert flushed.wait(10)
+        assert_equal(target.results, [[1, 2]])
+        batcher.close()
+        assert_equal(target.results, [[1, 2]])
+
+    @raises(ZeroDivisionError)
+    def test_timer_error(self):
+        batcher = concurrency.TimedBatcher(
+            tools.genMap.co(lambda batch: 1 // 0, DummyCoroutine()), 100, 0)
+        batcher.send(1)
+        batcher._timer.join(10)
+        batcher.send(2)
+
+
+class TestSharding(unittest.TestCase):
+
+    values = list(range(50))
+    expected = [val * val for val in values if val % 2]
+
+    def test_ordered(self):
+        dummy = DummyCoroutine()
+        tools.pushAll(self.values, coShard(
+            squareOddPipeline, dummy, workers=3, batchSize=4, ordered=True))
+
+        assert_equal(dummy.results, self.expected)
+        assert dummy.closed
+
+    def test_unordered(self):
+        dummy = DummyCoroutine()
+        tools.pushAll(self.values, coShard(
+            squareOddPipeline, dummy, workers=2, batchSize=4,
+            maxInFlight=1))
+
+        assert_equal(sorted(dummy.results), self.expected)
+        assert dummy.closed
+
+    def test_partitioned_by_key(self):
+        dummy = DummyCoroutine()
+        tools.pushAll(self.values, coShard(
+            squareOddPipeline, dummy, workers=2, batchSize=4,
+            key=lambda val: val % 5))
+
+        assert_equal(sorted(dummy.results), self.expected)
+
+    @raises(Exception)
+    def test_worker_failure(self):
+        tools.pushAll(self.values, coShard(
+            failingPipeline, DummyCoroutine(), workers=2, batchSize=4))
+
+    @raises(Exception)
+    def test_worker_exiting(self):
+        tools.pushAll(self.values, coShard(
+            exitingPipeline, DummyCoroutine(), workers=2, batchSize=4))
+
+    @raises(Exception)
+    def test_cannot_order_partitioned(self):
+        coShard(squareOddPipeline, DummyCoroutine(), workers=2,
+                key=square, ordered=True)
+
+
+class TestMethodDetection(unittest.TestCase):
+
+    def test_method_of_nested_class(self):
+        class Nested(object):
+            @invertibleGenerator
+            def gen(self, iterable):
+                for val in iterable:
+                    yield self, val
+
+        obj = Nested()
+        assertEqualPipelines(obj.gen, obj.gen.co, [1, 2, 3])
+
+    def test_function_nested_in_method(self):
+        class Outer(object):
+            def makeGen(self):
+                @invertibleGenerator
+                def gen(iterable):
+                    for val in iterable:
+                        yield val
+
+                return gen
+
+        gen = Outer().makeGen()
+        assertEqualPipelines(gen, gen.co, [1, 2, 3])
+
+    def test_bound_method_attributes(self):
+        obj = ClassWithScalingMethod(5)
+        method = obj.scale
+
+        assert method.__self__ is obj
+        assert method.__func__ is ClassWithScalingMethod.__dict__[
+            'scale'].func
+        assert_equal(method.__name__, 'scale')
+
+    def test_methods_keep_their_coroutines(self):
+        obj = ClassWithScalingMethod(5)
+        method = obj.scale
+        ClassWithGeneratorMethod(7).gen
+
+        assertEqualPipelines(method, method.co, [1, 2, 3])
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        instrumentation.enableInstrumentation()
+
+    def tearDown(self):
+        instrumentation.disableInstrumentation()
+
+    def stats(self, funcName):
+        """ The statistics of a stage of this module, defined in a test
+        method, looked up by its name inside the method """
+        prefix = __name__ + '.'
+        for stats in instrumentation.allStageStats():
+            if stats.name.startswith(prefix) and \
+                    stats.name[len(prefix):].rpartition('<locals>.')[2] == \
+                    funcName:
+                return stats
+        return None
+
+    def test_counts_and_times(self):
+        @invertibleGenerator
+        def genInstrumentedPairs(iterable):
+            buf = []
+            for elem in iterable:
+                buf.append(elem)
+                if len(buf) >= 2:
+                    yield tuple(buf)
+                    buf = []
+
+        assertEqualPipelines(
+            genInstrumentedPairs, genInstrumentedPairs.co, [1, 2, 3, 4, 5])
+
+        stats = self.stats('genInstrumentedPairs')
+        assert_equal(stats.instances, 1)
+        assert_equal(stats.elementsIn, 5)
+        assert_equal(stats.elementsOut, 2)
+        assert 0 <= stats.downstreamTime <= stats.totalTime
+        assert stats.ownTime >= 0
+
+    def test_batched(self):
+        @invertibleGenerator
+        def genInstrumentedPassthrough(iterable):
+            for val in iterable:
+                yield val
+
+        assertEqualBatchedPipelines(
+            genInstrumentedPassthrough, genInstrumentedPassthrough.co_batch,
+            [1, 2, 3, 4])
+
+        # the values of batches of 1, 2 and 3 values are counted
+        stats = self.stats('genInstrumentedPassthrough')
+        assert_equal(stats.elementsIn, 3 * 4)
+        assert_equal(stats.elementsOut, 3 * 4)
+
+    @unittest.skipIf(sys.version_info < (3, 3),
+                     "qualified names require python 3.3")
+    def test_methods_of_different_classes(self):
+        class First(object):
+            @invertibleGenerator
+            def genInstrumentedMethod(self, iterable):
+                for val in iterable:
+                    yield val
+
+        class Second(object):
+            @invertibleGenerator
+            def genInstrumentedMethod(self, iterable):
+                for val in iterable:
+                    yield val
+                    yield val
+
+        tools.pushAll([1, 2], First().genInstrumentedMethod.co(
+            DummyCoroutine()))
+        tools.pushAll([1, 2, 3], Second().genInstrumentedMethod.co(
+            DummyCoroutine()))
+
+        first = self.stats('First.genInstrumentedMethod')
+        second = self.stats('Second.genInstrumentedMethod')
+        assert_equal((first.elementsIn, first.elementsOut), (2, 2))
+        assert_equal((second.elementsIn, second.elementsOut), (3, 6))
+
+    def test_uninstrumented(self):
+        instrumentation.disableInstrumentation()
+
+        @invertibleGenerator
+        def genUninstrumented(iterable):
+            for val in iterable:
+                yield val
+
+        assertEqualPipelines(
+            genUninstrumented, genUninstrumented.co, [1, 2, 3])
+        assert self.stats('genUninstrumented') is None
+
+
+def lastTracebackEntry(pipeline, iterable):
+    """ Push values through a pipeline, returning the file name and source
+    line of the innermost frame of the exception raised. """
+
+    try:
+        runCoroutinePipeline(pipeline, iterable)
+    except ValueError:
+        fileName, _, _, line = traceback.extract_tb(sys.exc_info()[2])[-1]
+        return fileName, line
+
+    raise AssertionError("no exception raised")
+
+
+class TestSourceLocations(unittest.TestCase):
+
+    def test_original_location(self):
+        coroutineCode = six.get_function_code(transformAstWith(
+            globals(), None, [InvertGenerator])(genAfterLoop))
+        originalCode = six.get_function_code(genAfterLoop)
+
+        assert_equal(coroutineCode.co_filename, originalCode.co_filename)
+        assert_equal(coroutineCode.co_firstlineno, originalCode.co_firstlineno)
+
+    def test_traceback_points_to_generator_source(self):
+        fileName, line = lastTracebackEntry(genRaising.co, [1, None])
+
+        assert_equal(fileName,
+                     six.get_function_code(genRaising).co_filename)
+        assert_equal(line, 'raise ValueError("no value")')
+
+    @unittest.skipIf(not hasattr(ast_transformers.ast, 'unparse'),
+                     "unparsing requires python 3.9")
+    def test_inverted_source(self):
+        source = ast_transformers.invertedSource(tools.genPassthrough)
+
+        assert 'val = (yield)' in source
+        assert 'iterable.send(val)' in source
+
+    @unittest.skipIf(not hasattr(ast_transformers.ast, 'unparse'),
+                     "unparsing requires python 3.9")
+    def test_source_debugging(self):
+        ast_transformers.enableSourceDebugging()
+        try:
+            @invertibleGenerator
+            def genRaisingDebugged(iterable):
+                for val in iterable:
+                    if val is None:
+                        raise ValueError("no value")
+                    yield val
+        finally:
+            ast_transformers.disableSourceDebugging()
+
+        fileName, line = lastTracebackEntry(genRaisingDebugged.co, [None])
+
+        assert fileName.startswith('<coroutine genRaisingDebugged at ')
+        assert_equal(line, "raise ValueError('no value')")
+
+
+class TestCodeCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = CodeCache(self.directory)
+
+        # bypass the in-memory memoization of transformed code
+        self.transformedCodes = ast_transformers._transformedCodes
+        ast_transformers._transformedCodes = {}
+
+    def tearDown(self):
+        ast_transformers._transformedCodes = self.transformedCodes
+        shutil.rmtree(self.directory)
+
+    def _convert(self, func):
+        return coroutine(transformAstWith(
+            globals(), locals(), [InvertGenerator], cache=self.cache)(func))
+
+    def test_cached_conversion_is_equivalent(self):
+        l = [1, 2, 3]
+        for _ in range(2):
+            assertEqualPipelines(genAfterLoop, self._convert(genAfterLoop), l)
+            ast_transformers._transformedCodes.clear()
+
+        assert_equal(1, len(os.listdir(self.directory)))
+
+    def test_stale_entry_is_ignored(self):
+        self._convert(genAfterLoop)
+        assert_equal(
+            None, self.cache.load(genAfterLoop, 'stale', [InvertGenerator]))
+
+
+    def test_transformer_lists_have_separate_entries(self):
+        parses = []
+        parseFunction = ast_transformers._parseFunction
+
+        def countingParse(*args):
+            parses.append(args)
+            return parseFunction(*args)
+
+        ast_transformers._parseFunction = countingParse
+        try:
+            for _ in range(2):
+                for transformers in [[InvertGenerator],
+                                     [InvertGeneratorBatched]]:
+                    transformAstWith(globals(), locals(), transformers,
+                                     cache=self.cache)(genAfterLoop)
+                ast_transformers._transformedCodes.clear()
+        finally:
+            ast_transformers._parseFunction = parseFunction
+
+        # the second round is loaded from the cache
+        assert_equal(2, len(parses))
+        assert_equal(2, len(os.listdir(self.directory)))
+
+
+class TestLazyConversion(unittest.TestCase):
+
+    def setUp(self):
+        enableLazyConversion()
+
+    def tearDown(self):
+        disableLazyConversion()
+
+    def test_function_converted_on_first_use(self):
+        @invertibleGenerator
+        def genLazy(iterable):
+            for val in iterable:
+                yield val * 2
+
+        assert_equal(None, genLazy.co.coroutine)
+        assertEqualPipelines(genLazy, genLazy.co, [1, 2, 3])
+        assert genLazy.co.coroutine is not None
+
+    def test_method_converted_on_first_use(self):
+        class LazyMethods(object):
+            @invertibleGenerator
+            def gen(self, iterable):
+                for val in iterable:
+                    yield self, val
+
+        obj = LazyMethods()
+        assertEqualPipelines(obj.gen, obj.gen.co, [1, 2, 3])
+
+    def test_import_does_not_load_ast(self):
+        environment = dict(os.environ, GENERATORS_TO_COROUTINES_LAZY='1')
+        subprocess.check_call([
+            sys.executable, '-c',
+            'import sys, generators_to_coroutines; '
+            'sys.exit("ast" in sys.modules)'], env=environment)
+
+
+exampleModuleSource = textwrap.dedent("""
+        from generators_to_coroutines import invertibleGenerator
+
+
+        @invertibleGenerator
+        def genDouble(iterable):
+            for val in iterable:
+                yield val * 2
+
+
+        class Stages(object):
+
+            @invertibleGenerator
+            def gen(self, iterable):
+                for val in iterable:
+                    yield self, val
+
+
+        def makeScaler(factor):
+
+            @invertibleGenerator
+            def genScale(iterable):
+                for val in iterable:
+                    yield val * factor
+
+            return genScale
+        """)
+
+
+def failToGetSource(func):
+    raise AssertionError("source retrieved for %s" % func)
+
+
+def withoutSourceRetrieval(func):
+    """ Call func, failing if the source of any function is retrieved to
+    convert it. Memoized conversions are forgotten first, since functions
+    with the same code would otherwise not be converted again. """
+
+    ast_transformers.clearTransformedCodes()
+    originalFunctionSource = ast_transformers._functionSource
+    ast_transformers._functionSource = failToGetSource
+    try:
+        return func()
+    finally:
+        ast_transformers._functionSource = originalFunctionSource
+
+
+def assertExampleModuleWorks(module):
+    obj = module.Stages()
+    scaler = module.makeScaler(3)
+    for gen, co in [(module.genDouble, module.genDouble.co),
+                    (obj.gen, obj.gen.co),
+                    (scaler, scaler.co)]:
+        assertEqualPipelines(gen, co, [1, 2, 3])
+
+
+class TestInvertModule(unittest.TestCase):
+
+    moduleName = 'invert_module_example'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory,
+                               self.moduleName + '.py'), 'w') as module:
+            module.write(exampleModuleSource)
+        sys.path.insert(0, self.directory)
+
+    def tearDown(self):
+        sys.path.remove(self.directory)
+        sys.modules.pop(self.moduleName, None)
+        shutil.rmtree(self.directory)
+
+    def test_no_per_function_source_retrieval(self):
+        withoutSourceRetrieval(lambda: assertExampleModuleWorks(
+            invertModule(self.moduleName)))
+
+    @raises(AssertionError)
+    def test_plain_import_retrieves_source(self):
+        """ The test above would catch retrieving the source per function """
+        withoutSourceRetrieval(lambda: __import__(self.moduleName))
+
+
+class TestAheadOfTimeCompilation(unittest.TestCase):
+
+    def setUp(self):
+        # generated code is looked up once per module name
+        self.packageName = 'aot_example_' + self._testMethodName
+        self.directory = tempfile.mkdtemp()
+        self.packageDirectory = os.path.join(self.directory, self.packageName)
+        os.mkdir(self.packageDirectory)
+        open(os.path.join(self.packageDirectory, '__init__.py'), 'w').close()
+        self.modulePath = os.path.join(self.packageDirectory, 'stages.py')
+        with open(self.modulePath, 'w') as module:
+            module.write(exampleModuleSource)
+        sys.path.insert(0, self.directory)
+
+    def tearDown(self):
+        sys.path.remove(self.directory)
+        for name in list(sys.modules):
+            if name.startswith(self.packageName):
+                del sys.modules[name]
+        shutil.rmtree(self.directory)
+
+    def _importStages(self):
+        __import__(self.packageName + '.stages')
+        return sys.modules[self.packageName + '.stages']
+
+    @unittest.skipIf(not hasattr(ast_transformers.ast, 'unparse'),
+                     "unparsing requires python 3.9")
+    def test_generated_module_is_used(self):
+        from .compiler import compilePackage
+
+        assert_equal(
+            [os.path.join(self.packageDirectory, '_coroutines', 'stages.py')],
+            compilePackage(self.packageName))
+
+        withoutSourceRetrieval(
+            lambda: assertExampleModuleWorks(self._importStages()))
+
+    @unittest.skipIf(not hasattr(ast_transformers.ast, 'unparse'),
+                     "unparsing requires python 3.9")
+    def test_out_of_date_generated_module_is_ignored(self):
+        from .compiler import compilePackage
+
+        compilePackage(self.packageName)
+        with open(self.modulePath, 'a') as module:
+            module.write('\n# changed\n')
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            assertExampleModuleWorks(self._importStages())
+
+        assert_equal(1, len(caught))
+
+    @unittest.skipIf(not hasattr(ast_transformers.ast, 'unparse'),
+                     "unparsing requires python 3.9")
+    def test_top_level_module_is_rejected(self):
+        from .compiler import compilePackage
+
+        moduleName = self.packageName + '_module'
+        with open(os.path.join(self.directory, moduleName + '.py'), 'w') \
+                as module:
+            module.write(exampleModuleSource)
+
+        self.assertRaises(Exception, compilePackage, moduleName)
+        assert not os.path.exists(os.path.join(self.directory, '_coroutines'))
+
+    @unittest.skipIf(not hasattr(ast_transformers.ast, 'unparse'),
+                     "unparsing requires python 3.9")
+    def test_annotations_are_not_evaluated(self):
+        from .compiler import compilePackage
+
+        with open(self.modulePath, 'w') as module:
+            module.write(textwrap.dedent("""
+                from typing import Iterable, Iterator
+
+                from generators_to_coroutines import invertibleGenerator
+
+
+                @invertibleGenerator
+                def genDouble(iterable: Iterable[int], *rest: int,
+                              factor: int = 2) -> Iterator[int]:
+                    for val in iterable:
+                        yield val * factor
+                """))
+
+        compilePackage(self.packageName)
+        stages = withoutSourceRetrieval(self._importStages)
+        assertEqualPipelines(stages.genDouble, stages.genDouble.co, [1, 2])
@@ -1,29 +1,225 @@
 from .decorators import invertibleGenerator, coroutine
+from collections import OrderedDict, deque, namedtuple
+from itertools import count, islice
+import six
+from six.moves import map, zip
+import codecs
+import time
 
+_timer = getattr(time, 'perf_counter', time.time)
 
-def pushFromIterable(iterable, target):
 
-    try:
-        for elem in iterable:
-            target.send(elem)
+class PushStats(namedtuple('PushStats', ['pushed', 'elapsed', 'exhausted'])):
+    """ Result of pushing values to a target: the number of values pushed, the
+    time it took in seconds, and whether no more values can be pushed,
+    because the iterator is exhausted or the target has finished. """
+
+    __slots__ = ()
+
+
+def _push(iterator, target, limit=None):
+    """ Push all values of an iterator, or at most limit values, to a target,
+    looping in C rather than in python. Returns the number of values the
+    target accepted without finishing.
+
+    A StopIteration raised by target.send ends map like the end of the
+    iterator does. A counter is zipped after the sends, which only advances
+    once a send has completed, so that a target finishing on any value, even
+    the last one, is not counted as having accepted it. """
 
+    send = target.send
+    values = iterator if limit is None else islice(iterator, limit)
+
+    counter = count()
+    deque(zip(map(send, values), counter), 0)
+    return next(counter)
+
+
+def pushAll(iterable, target, close=True):
+    """ Push all values of an iterable to a target, until either is
+    exhausted, and close the target. Returns PushStats. """
+
+    start = _timer()
+    pushed = _push(iter(iterable), target)
+    if close:
         target.close()
-    except StopIteration:
-        pass
+
+    return PushStats(pushed, _timer() - start, True)
+
+
+def pushUpTo(iterator, target, limit):
+    """ Push at most limit values of an iterator to a target, leaving the
+    target open and the rest of the iterator to be pushed later. Returns
+    PushStats. """
+
+    start = _timer()
+    pushed = _push(iterator, target, limit)
+
+    return PushStats(pushed, _timer() - start, pushed < limit)
+
+
+def pushDuring(iterator, target, seconds, sliceSize=256):
+    """ Push values of an iterator to a target for about the given time,
+    checking the clock every sliceSize values, leaving the target open and
+    the rest of the iterator to be pushed later. Returns PushStats. """
+
+    start = _timer()
+    deadline = start + seconds
+    pushed = 0
+
+    while True:
+        slicePushed = _push(iterator, target, sliceSize)
+        pushed += slicePushed
+
+        now = _timer()
+        if slicePushed < sliceSize or now >= deadline:
+            break
+
+    return PushStats(pushed, now - start, slicePushed < sliceSize)
+
+
+def pushFromIterable(iterable, target):
+    """ Push all values of an iterable to a target, and close it (see
+    pushAll) """
+
+    return pushAll(iterable, target)
+
+
+def pushChunksFromIterable(iterable, target, chunkSize=256):
+    """ Push lists of up to chunkSize values at a time, e.g. to a co_batch
+    coroutine """
+
+    iterator = iter(iterable)
+    chunks = iter(lambda: list(islice(iterator, chunkSize)), [])
+    return pushAll(chunks, target)
 
 
 @invertibleGenerator
 def genPairs(iterable):
     """ Aggregate two consecutive values into pairs """
 
-    buf = []
+    first = None
+    paired = False
 
     for elem in iterable:
-        buf.append(elem)
+        if paired:
+            yield (first, elem)
+            paired = False
+        else:
+            first = elem
+            paired = True
+
+
+@invertibleGenerator
+def genChunk(size, iterable):
+    """ Aggregate consecutive values into tuples of size values (tumbling
+    windows), the last one possibly shorter """
+
+    if size < 1:
+        raise ValueError("Chunks must have at least one value, not %d" % size)
+
+    buf = [None] * size
+    index = 0
 
-        if len(buf) >= 2:
+    for val in iterable:
+        buf[index] = val
+        index += 1
+
+        if index == size:
             yield tuple(buf)
-            buf = []
+            index = 0
+
+    if index:
+        yield tuple(buf[:index])
+
+
+@invertibleGenerator
+def genWindow(size, iterable, step=1):
+    """ Aggregate values into tuples of size consecutive values (sliding
+    windows), starting every step values. The values of the window after the
+    last full one are passed on as a shorter tuple, unless none of them are
+    new. """
+
+    if size < 1 or step < 1:
+        raise ValueError("Windows must have at least one value and start "
+                         "every one value or more, not %d and %d" %
+                         (size, step))
+
+    window = deque(maxlen=size)
+    untilNext = size
+    fresh = 0
+
+    for val in iterable:
+        window.append(val)
+        fresh += 1
+        untilNext -= 1
+
+        if untilNext == 0:
+            yield tuple(window)
+            untilNext = step
+            fresh = 0
+
+    if fresh and untilNext < size:
+        yield tuple(window)[untilNext - size:]
+
+
+@invertibleGenerator
+def genTimeWindow(seconds, iterable, clock=_timer):
+    """ Aggregate values into tuples of the values received within seconds of
+    the first one (tumbling windows in time). A window is passed on when the
+    first value after it arrives, or when the iterable is exhausted. """
+
+    buf = []
+    deadline = None
+
+    for val in iterable:
+        now = clock()
+        if deadline is not None and now >= deadline:
+            yield tuple(buf)
+            del buf[:]
+            deadline = None
+
+        if deadline is None:
+            deadline = now + seconds
+        buf.append(val)
+
+    if buf:
+        yield tuple(buf)
+
+
+@invertibleGenerator
+def genBatch(size, iterable, seconds=None, clock=_timer):
+    """ Aggregate values into lists of up to size values, for sinks that
+    are faster in bulk. A batch is passed on once full, with seconds also
+    when a value arrives at least seconds after the first one of the batch,
+    and when the iterable is exhausted. Deadlines are only checked as values
+    arrive: concurrency.TimedBatcher also passes batches on when none do. """
+
+    if size < 1:
+        raise ValueError("Batches must have at least one value, not %d" %
+                         size)
+
+    batch = []
+    deadline = None
+
+    for val in iterable:
+        batch.append(val)
+
+        if len(batch) >= size:
+            yield batch
+            batch = []
+            deadline = None
+        elif seconds is not None:
+            now = clock()
+            if deadline is None:
+                deadline = now + seconds
+            elif now >= deadline:
+                yield batch
+                batch = []
+                deadline = None
+
+    if batch:
+        yield batch
 
 
 @invertibleGenerator
@@ -51,18 +247,106 @@ def genMap(func, iterable):
         yield func(val)
 
 
+@invertibleGenerator
+def genDecode(iterable, encoding='utf-8', errors='strict'):
+    """ Decode bytes, or buffers such as memoryview, to text """
+
+    for val in iterable:
+        yield codecs.decode(val, encoding, errors)
+
+
+@invertibleGenerator
+def genParallelMap(func, iterable, workers=4, window=None):
+    """ Map function on all values on a pool of worker threads, with at most
+    window values (by default twice the number of workers) in flight at a
+    time. Results are passed on in order, and the remaining ones once the
+    iterable is exhausted, or the coroutine closed. Worth it for functions
+    that release the GIL, e.g. compression, hashing or I/O. """
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(workers)
+    inFlight = deque()
+    window = window or 2 * workers
+
+    try:
+        for val in iterable:
+            inFlight.append(executor.submit(func, val))
+            if len(inFlight) >= window:
+                yield inFlight.popleft().result()
+
+        while inFlight:
+            yield inFlight.popleft().result()
+    finally:
+        executor.shutdown(wait=False)
+
+
+def _closeTargets(targets):
+    """ Close each of the targets once, even if it appears several times """
+
+    closed = set()
+    for target in targets:
+        if target is not None and id(target) not in closed:
+            closed.add(id(target))
+            target.close()
+
+
 @coroutine
 def coSplit(predicate, trueTarget, falseTarget):
+    """ Send values for which predicate is true to trueTarget, and the others
+    to falseTarget. Closing closes both. """
 
-    while True:
-        val = (yield)
-        if predicate(val):
-            trueTarget.send(val)
-        else:
-            falseTarget.send(val)
+    try:
+        while True:
+            val = (yield)
+            if predicate(val):
+                trueTarget.send(val)
+            else:
+                falseTarget.send(val)
+    except GeneratorExit:
+        _closeTargets([trueTarget, falseTarget])
+
+
+@coroutine
+def coRoute(keyFunc, targets, default=None, factory=None, maxRoutes=None):
+    """ Send each value to the target for its key, targets[keyFunc(val)],
+    looked up in a dictionary whatever the number of targets.
+
+    Values with a key that has no target go to the one created by
+    factory(key) the first time the key is seen. At most maxRoutes created
+    targets are kept, closing the one idle the longest to make room for a new
+    one. Without a factory, such values go to default, and raise KeyError if
+    there is none. Closing closes all targets. """
+
+    routes = dict(targets)
+    created = OrderedDict()
+    # python 2 has no OrderedDict.move_to_end
+    markUsed = getattr(created, 'move_to_end', None) or \
+        (lambda key: created.__setitem__(key, created.pop(key)))
+
+    try:
+        while True:
+            val = (yield)
+            key = keyFunc(val)
+            target = routes.get(key)
+
+            if target is None:
+                if factory is not None:
+                    target = routes[key] = created[key] = factory(key)
+                    if maxRoutes is not None and len(created) > maxRoutes:
+                        idleKey, idleTarget = created.popitem(last=False)
+                        del routes[idleKey]
+                        idleTarget.close()
+                elif default is not None:
+                    target = default
+                else:
+                    raise KeyError(key)
+            elif maxRoutes is not None and key in created:
+                markUsed(key)
 
-    trueTarget.close()
-    falseTarget.close()
+            target.send(val)
+    except GeneratorExit:
+        _closeTargets(list(six.itervalues(routes)) + [default])
 
 
 @coroutine
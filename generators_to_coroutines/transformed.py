@@ -0,0 +1,55 @@
+""" Helpers for working with transformed code objects, shared by conversion at
+runtime and ahead of time. This module is cheap to import: it does not depend
+on the AST machinery. """
+
+import types
+
+import six
+
+
+# Bump whenever the generated code changes, to invalidate persisted caches and
+# generated modules.
+TRANSFORMER_VERSION = 3
+
+
+def iterateCodes(code):
+    """ Iterate over the code objects of all functions and classes defined,
+    possibly nested, in the given code. """
+
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            yield const
+            for nested in iterateCodes(const):
+                yield nested
+
+
+def findFunctionCode(code, funcName):
+    """ Find the code object of a function defined (possibly nested) in the
+    given code. """
+
+    for nested in iterateCodes(code):
+        if nested.co_name == funcName:
+            return nested
+
+    return None
+
+
+def bindFunction(code, func, globalEnv):
+    """ Create a function from transformed code, bound to the given globals
+    and to the defaults and closure cells of the original function. """
+
+    closure = None
+    if code.co_freevars:
+        cells = dict(zip(six.get_function_code(func).co_freevars,
+                         six.get_function_closure(func)))
+        closure = tuple(cells[name] for name in code.co_freevars)
+
+    boundFunc = types.FunctionType(
+        code, globalEnv, func.__name__,
+        six.get_function_defaults(func), closure)
+
+    for attr in ('__kwdefaults__', '__qualname__'):
+        if hasattr(func, attr):
+            setattr(boundFunc, attr, getattr(func, attr))
+
+    return boundFunc
@@ -22,6 +22,7 @@ setup(
     ],
     license='BSD',
     packages=['generators_to_coroutines'],
+    extras_require={'numeric': ['numpy']},
     tests_require=['nose', 'nose-parameterized'],
     test_suite='nose.collector',
 )